@@ -1,31 +1,42 @@
 import os
+import threading
 from typing import TypedDict, List, Any, Dict, Annotated
 import operator
 from dotenv import load_dotenv
 
-from langchain_groq import ChatGroq
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
 
 # Import our tools
 from agents.utils_sql import query_sql_db, get_customer_profile
-from agents.rag_agent import query_policies
+from agents.rag_agent import query_policies, query_policies_batch
 
 load_dotenv()
 
-# 1) Groq LLM (Pure Groq)
-llm = ChatGroq(
-    model="llama-3.1-8b-instant",
-    temperature=0
-)
-
-# 2) Tools
+# 1) Tools
 # query_policies is already a @tool, so we don't need to call it like a factory
-tools = [query_sql_db, get_customer_profile, query_policies]
+tools = [query_sql_db, get_customer_profile, query_policies, query_policies_batch]
+
+# 2) Groq LLM (Pure Groq), built lazily so importing this module stays cheap.
+# The app warms it up in the background (see services/warmup.py).
+_llm_lock = threading.Lock()
+_llm_with_tools = None
 
-# 3) Bind tools to Groq model
-llm_with_tools = llm.bind_tools(tools)
+def get_llm():
+    """Return the Groq chat model with our tools bound, creating it on first use."""
+    global _llm_with_tools
+    if _llm_with_tools is None:
+        with _llm_lock:
+            if _llm_with_tools is None:
+                from langchain_groq import ChatGroq
+                llm = ChatGroq(
+                    model="llama-3.1-8b-instant",
+                    temperature=0
+                )
+                # 3) Bind tools to Groq model
+                _llm_with_tools = llm.bind_tools(tools)
+    return _llm_with_tools
 
 class AgentState(TypedDict):
     messages: Annotated[List[BaseMessage], operator.add]
@@ -35,7 +46,7 @@ def assistant_node(state: AgentState) -> Dict:
     The model decides whether to answer directly or call tools.
     """
     # Simply invoke the model with tools bound
-    response = llm_with_tools.invoke(state["messages"])
+    response = get_llm().invoke(state["messages"])
     return {"messages": [response]}
 
 tool_node = ToolNode(tools)
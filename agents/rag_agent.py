@@ -1,15 +1,47 @@
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.tools.retriever import create_retriever_tool
 from dotenv import load_dotenv
 import os
 
-load_dotenv()
+from typing import List
+
+from langchain_core.documents import Document
 
-CHROMA_PATH = "data/chroma_db"
+from services.retriever_registry import similarity_search, batch_similarity_search
+from services.context_packing import pack_context, CONTEXT_TOKEN_BUDGET
+
+load_dotenv()
 
 from langchain_core.tools import tool
 
+def _format_context(results, debug_info: dict) -> str:
+    """Render packed chunks as the Context/Debug/Sources block the UI parses."""
+    formatted_results = []
+    source_list = []
+    for i, doc in enumerate(results):
+        source = doc.metadata.get("doc_name", os.path.basename(doc.metadata.get("source", "Unknown")))
+        page = doc.metadata.get("page", "N/A")
+        content = doc.page_content.replace("\n", " ")
+        sub_queries = doc.metadata.get("sub_queries")
+        matched = f" [Sub-queries: {', '.join(str(q) for q in sub_queries)}]" if sub_queries else ""
+        # Near-duplicates dropped during packing keep their citation here
+        also_cited = doc.metadata.get("also_cited") or []
+        also = f" (Also in: {'; '.join(also_cited)})" if also_cited else ""
+        formatted_results.append(f"Source {i+1}: {source} (Page {page}){also}{matched}\nContent: {content}\n")
+        source_list.append(f"{source} (p. {page})")
+        source_list.extend(also_cited)
+        
+    context_str = "\n".join(formatted_results)
+    
+    # We return the raw context to the LLM, but we append a strict instruction
+    # This is because the tool output goes back to the graph/LLM to generate the final answer.
+    return f"""
+Context:
+{context_str}
+
+Debug: {str(debug_info)}
+Sources: {", ".join(list(set(source_list)))}
+"""
+
 @tool
 def query_policies(query: str) -> str:
     """
@@ -17,43 +49,77 @@ def query_policies(query: str) -> str:
     Returns the relevant text chunks and their source documents.
     """
     try:
-        # Re-initialize internally to ensure we get fresh state if needed
-        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        vectorstore = Chroma(persist_directory=CHROMA_PATH, embedding_function=embeddings)
-        
-        # Retrieve top 4 results (increased from 3 for better coverage)
-        results = vectorstore.similarity_search(query, k=4)
+        # Hybrid BM25 + vector retrieval (fused with RRF) recalls exact policy terms,
+        # so 3 chunks cover what plain vector search needed 4 for.
+        # Served from the shared result/embedding caches; PolicyEngine writes invalidate them
+        results, cache_info = similarity_search(query, k=3)
         
         debug_info = {
             "query": query,
             "retrieved_count": len(results),
-            "top_source": results[0].metadata.get("source", "N/A") if results else "None"
+            "top_source": results[0].metadata.get("source", "N/A") if results else "None",
+            **cache_info
         }
 
         if not results:
              return f"No relevant policy information found in indexed documents about '{query}'. (Debug: 0 chunks found)"
         
+        # Merge overlapping chunks, drop near-duplicates and fit the token budget
+        packed, packing_info = pack_context(results)
+        debug_info.update(packing_info)
+
         # Format output for the LLM
-        formatted_results = []
-        source_list = []
-        for i, doc in enumerate(results):
-            source = doc.metadata.get("doc_name", os.path.basename(doc.metadata.get("source", "Unknown")))
-            page = doc.metadata.get("page", "N/A")
-            content = doc.page_content.replace("\n", " ")
-            formatted_results.append(f"Source {i+1}: {source} (Page {page})\nContent: {content}\n")
-            source_list.append(f"{source} (p. {page})")
-            
-        context_str = "\n".join(formatted_results)
+        return _format_context(packed, debug_info)
         
-        # We return the raw context to the LLM, but we append a strict instruction
-        # This is because the tool output goes back to the graph/LLM to generate the final answer.
-        return f"""
-Context:
-{context_str}
+    except Exception as e:
+        return f"Error querying policies: {str(e)}"
+
+@tool
+def query_policies_batch(queries: List[str]) -> str:
+    """
+    Search company policies for several sub-questions in ONE call.
+    Use this instead of calling query_policies repeatedly when a question has multiple parts
+    (e.g. refund eligibility AND shipping times AND late refunds).
+    Returns the merged, de-duplicated text chunks; each chunk lists the sub-queries (1-based) it answers.
+    """
+    try:
+        queries = [q for q in queries if q and q.strip()]
+        if not queries:
+            return "ERROR: Provide at least one sub-query."
+
+        # One embedding pass and one vector-store call for all sub-queries
+        per_query, batch_info = batch_similarity_search(queries, k=3)
+
+        # Merge rank by rank so every sub-query's best chunk comes first; duplicates keep all attributions.
+        # Work on copies: the per-query lists are shared with the retrieval cache.
+        merged = {}
+        for rank in range(max(len(docs) for docs in per_query)):
+            for q_idx, docs in enumerate(per_query):
+                if rank >= len(docs):
+                    continue
+                doc = docs[rank]
+                key = doc.metadata.get("chunk_id") or doc.page_content
+                if key not in merged:
+                    merged[key] = Document(page_content=doc.page_content, metadata={**doc.metadata, "sub_queries": []})
+                if q_idx + 1 not in merged[key].metadata["sub_queries"]:
+                    merged[key].metadata["sub_queries"].append(q_idx + 1)
+
+        debug_info = {
+            "queries": queries,
+            "retrieved_count": sum(len(docs) for docs in per_query),
+            "unique_chunks": len(merged),
+            **batch_info
+        }
+
+        if not merged:
+            return f"No relevant policy information found in indexed documents for {queries}. (Debug: 0 chunks found)"
+
+        # One batch replaces len(queries) separate calls, so it gets their combined budget
+        packed, packing_info = pack_context(list(merged.values()), token_budget=CONTEXT_TOKEN_BUDGET * len(queries))
+        debug_info.update(packing_info)
+
+        sub_queries = "\n".join(f"{i+1}. {q}" for i, q in enumerate(queries))
+        return f"\nSub-queries:\n{sub_queries}\n{_format_context(packed, debug_info)}"
 
-Debug: {str(debug_info)}
-Sources: {", ".join(list(set(source_list)))}
-"""
-        
     except Exception as e:
         return f"Error querying policies: {str(e)}"
@@ -1,13 +1,29 @@
+import os
+import re
+import json
 import sqlite3
-from typing import Any, List, Dict, Union
+from typing import Any, List, Dict, Optional, Union
 from langchain_core.tools import tool
 
-# Adjusted path to match existing project structure
-DB_PATH = "data/database.sqlite"
+from services.db_pool import read_pool
+from services.cache import LRUCache
 
-def _rows_to_dicts(cursor, rows) -> List[Dict[str, Any]]:
-    cols = [c[0] for c in cursor.description] if cursor.description else []
-    return [dict(zip(cols, r)) for r in rows]
+# Rows returned per query_sql_db call; the agent pages with `offset` for more
+SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "50"))
+# Rows pulled from SQLite per fetchmany() call
+FETCH_BATCH_SIZE = 500
+# Candidate customers listed when a profile lookup is ambiguous
+PROFILE_MATCH_LIMIT = 10
+# Most recent tickets returned per profile call; older ones are paged with ticket_cursor
+PROFILE_TICKET_LIMIT = int(os.getenv("PROFILE_TICKET_LIMIT", "10"))
+# The trigram tokenizer can't match anything shorter
+FTS_MIN_QUERY_CHARS = 3
+SQL_RESULT_CACHE_SIZE = int(os.getenv("SQL_RESULT_CACHE_SIZE", "256"))
+
+# Tool outputs keyed by database version (PRAGMA data_version) + normalized input,
+# so any write, including "Reset Database", makes every older entry unreachable
+sql_result_cache = LRUCache(maxsize=SQL_RESULT_CACHE_SIZE)
+_cached_version = None
 
 # Schema Definitions
 CUSTOMERS_COLUMNS = ["id", "name", "email", "phone", "account_status", "created_at"]
@@ -28,8 +44,67 @@ def _validate_columns(query: str) -> Union[bool, str]:
             
     return True
 
+def normalize_sql(query: str) -> str:
+    """Collapse whitespace and drop trailing semicolons, leaving string literals (and case) untouched."""
+    parts = re.split(r"('(?:[^']|'')*')", query.strip().rstrip(";").strip())
+    return "".join(part if i % 2 else re.sub(r"\s+", " ", part) for i, part in enumerate(parts))
+
+
+def _cached(key: tuple, compute) -> str:
+    """
+    Serve a tool result from sql_result_cache if the database hasn't changed since
+    it was computed. The version is read before computing, so a result that races
+    with a write is stored under the old version and never served afterwards.
+    """
+    global _cached_version
+    try:
+        version = read_pool.data_version()
+    except Exception:
+        return compute()  # e.g. no database yet: nothing to cache against
+    if version != _cached_version:
+        # Old entries can never be hit again; free them
+        sql_result_cache.clear()
+        _cached_version = version
+    result = sql_result_cache.get((version,) + key)
+    if result is None:
+        result = compute()
+        if not result.startswith("ERROR"):
+            sql_result_cache.put((version,) + key, result)
+    return result
+
+
+def _skip_rows(cursor, count: int):
+    # Stream past rows before the requested page without holding them
+    while count > 0:
+        skipped = len(cursor.fetchmany(min(count, FETCH_BATCH_SIZE)))
+        if not skipped:
+            break
+        count -= skipped
+
+
+def _count_rows(cursor, query: str) -> Optional[int]:
+    """Total row count of a query, computed inside SQLite (None if it can't be wrapped)."""
+    try:
+        cursor.execute(f"SELECT COUNT(*) FROM ({query.strip().rstrip(';')})")
+        return cursor.fetchone()[0]
+    except sqlite3.Error:
+        return None
+
+
+def _compact_result(columns: List[str], rows: List[tuple], offset: int, total: Optional[int], truncated: bool) -> str:
+    """
+    Columnar JSON: column names once, then one array per row, plus paging info.
+    e.g. {"columns":["id","name"],"rows":[[1,"Ema Patel"]],"offset":0,"total":1}
+    """
+    result: Dict[str, Any] = {"columns": columns, "rows": [list(r) for r in rows], "offset": offset, "total": total}
+    if truncated:
+        result["truncated"] = f"showing rows {offset + 1}-{offset + len(rows)} of {total if total is not None else 'more'}"
+        result["next_offset"] = offset + len(rows)
+    return json.dumps(result, default=str, separators=(",", ":"))
+
+
 @tool
-def query_sql_db(query: str) -> str:
+def query_sql_db(query: str, offset: int = 0) -> str:
     """
     Run a READ-ONLY SQL query on the support SQLite DB.
     
@@ -40,6 +115,10 @@ def query_sql_db(query: str) -> str:
     CRITICAL: 
     - Use 'account_status' for customers (Values: 'Active', 'Suspended').
     - Only SELECT queries are allowed.
+    
+    OUTPUT: {"columns": [...], "rows": [[...], ...], "offset", "total"}. Large
+    results are cut to one page; if "truncated" is present, call again with
+    offset=next_offset for the next page, or use COUNT/GROUP BY instead.
     """
     q = query.strip().lower()
     if not q.startswith("select"):
@@ -51,68 +130,154 @@ def query_sql_db(query: str) -> str:
         return validation
 
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = None
-        cur = conn.cursor()
-        cur.execute(query)
-        rows = cur.fetchall()
-        data = _rows_to_dicts(cur, rows)
-        return str(data)
+        offset = max(int(offset or 0), 0)
+    except (TypeError, ValueError):
+        return f"ERROR: offset must be an integer, got {offset!r}"
+    return _cached(("query", normalize_sql(query), offset), lambda: _run_query(query, offset))
+
+
+def _run_query(query: str, offset: int) -> str:
+    try:
+        # Pooled read-only connection (services/db_pool.py)
+        with read_pool.cursor() as cur:
+            cur.execute(query)
+            columns = [c[0] for c in cur.description] if cur.description else []
+            _skip_rows(cur, offset)
+            # One extra row tells us whether there is more without reading it all
+            rows = cur.fetchmany(SQL_MAX_ROWS + 1)
+            truncated = len(rows) > SQL_MAX_ROWS
+            rows = rows[:SQL_MAX_ROWS]
+            total = _count_rows(cur, query) if truncated or (offset and not rows) else offset + len(rows)
+        return _compact_result(columns, rows, offset, total, truncated)
     except Exception as e:
         return f"ERROR: {type(e).__name__}: {e}"
 
+def _has_search_index(cur) -> bool:
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'customers_fts'")
+    return cur.fetchone() is not None
+
+
+def _find_customers(cur, name_query: str):
+    """
+    Customers whose name (or, failing that, email) contains name_query.
+    Uses the trigram FTS index (scripts/init_db.py) when present, else a LIKE scan.
+    Returns (up to PROFILE_MATCH_LIMIT + 1 customers, the SQL that found them).
+    """
+    term = name_query.strip()
+    for column in ("name", "email"):
+        if len(term) >= FTS_MIN_QUERY_CHARS and _has_search_index(cur):
+            sql = ("SELECT c.* FROM customers_fts f JOIN customers c ON c.id = f.rowid "
+                   "WHERE customers_fts MATCH ? ORDER BY f.rank LIMIT ?")
+            # Column filter + quoted phrase, so the input is never parsed as FTS syntax
+            params = (f'{column} : "{term.replace(chr(34), chr(34) * 2)}"', PROFILE_MATCH_LIMIT + 1)
+        else:
+            sql = f"SELECT * FROM customers WHERE {column} LIKE ? LIMIT ?"
+            params = (f"%{term}%", PROFILE_MATCH_LIMIT + 1)
+        cur.execute(sql, params)
+        customers = [dict(row) for row in cur.fetchall()]
+        if customers:
+            return customers, sql.replace("?", "{}").format(*(repr(p) for p in params))
+    return [], None
+
+
+SUMMARY_QUERY = """
+SELECT COUNT(*) AS total,
+       COALESCE(SUM(status = 'Open'), 0) AS open,
+       COALESCE(SUM(status = 'Closed'), 0) AS closed,
+       COALESCE(SUM(priority = 'High'), 0) AS high_priority
+FROM tickets WHERE customer_id = ?
+"""
+
+
+def _ticket_page(cur, customer_id: int, ticket_cursor: Optional[str]):
+    """
+    Newest-first tickets, PROFILE_TICKET_LIMIT at a time. Keyset pagination on
+    (created_at, id): the cursor is the last ticket of the previous page, so
+    page N costs the same as page 1 (no OFFSET scan).
+    Returns (tickets, next_cursor or None, the SQL used).
+    """
+    sql = "SELECT * FROM tickets WHERE customer_id = ?"
+    params: List[Any] = [customer_id]
+    if ticket_cursor:
+        created_at, ticket_id = ticket_cursor.rsplit("|", 1)
+        sql += " AND (created_at, id) < (?, ?)"
+        params += [created_at, int(ticket_id)]
+    sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    cur.execute(sql, params + [PROFILE_TICKET_LIMIT + 1])
+    tickets = [dict(row) for row in cur.fetchall()]
+    next_cursor = None
+    if len(tickets) > PROFILE_TICKET_LIMIT:
+        tickets = tickets[:PROFILE_TICKET_LIMIT]
+        next_cursor = f"{tickets[-1]['created_at']}|{tickets[-1]['id']}"
+    return tickets, next_cursor, sql
+
+
+def _attach_interactions(cur, tickets: List[Dict]):
+    """Add each ticket's interactions (oldest first), in one query for the whole page."""
+    if not tickets:
+        return
+    by_id = {t["id"]: t for t in tickets}
+    for ticket in tickets:
+        ticket["interactions"] = []
+    cur.execute(
+        f"SELECT * FROM interactions WHERE ticket_id IN ({','.join('?' * len(by_id))}) ORDER BY ticket_id, created_at, id",
+        list(by_id)
+    )
+    for row in cur.fetchall():
+        by_id[row["ticket_id"]]["interactions"].append(dict(row))
+
+
 @tool
-def get_customer_profile(name_query: str) -> str:
+def get_customer_profile(name_query: str, ticket_cursor: Optional[str] = None,
+                         include_interactions: bool = False) -> str:
     """
-    Retrieves a full customer profile including contact details and ticket history.
-    Use this tool when asked for a customer overview, profile, or history.
+    Retrieves a customer profile: contact details, ticket summary counts and the
+    most recent tickets. Use this tool when asked for a customer overview, profile, or history.
+    - For older tickets, call again with ticket_cursor set to the returned
+      "next_ticket_cursor".
+    - include_interactions=True adds the agent interactions of the returned tickets.
     """
+    # Both lookups ignore ASCII case (FTS trigram, LIKE), so those queries can share an entry
+    name_key = name_query.strip().lower() if name_query.isascii() else name_query.strip()
+    key = ("profile", name_key, ticket_cursor, bool(include_interactions))
+    return _cached(key, lambda: _load_profile(name_query, ticket_cursor, include_interactions))
+
+
+def _load_profile(name_query: str, ticket_cursor: Optional[str], include_interactions: bool) -> str:
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        
-        # 1. Find Customer
-        # Basic fuzzy search
-        cur.execute("SELECT * FROM customers WHERE name LIKE ? OR email LIKE ?", (f"%{name_query}%", f"%{name_query}%"))
-        customers = [dict(row) for row in cur.fetchall()]
-        
-        if not customers:
-            conn.close()
-            return str({"error": "No matching customer found in the database."})
+        with read_pool.cursor(sqlite3.Row) as cur:
+            # 1. Find Customer (indexed substring search on name, then email)
+            customers, customer_query = _find_customers(cur, name_query)
             
-        if len(customers) > 1:
-            conn.close()
-            return str({"error": f"Found {len(customers)} customers matching '{name_query}'. Please be more specific.", "matches": [c['name'] for c in customers]})
+            if not customers:
+                return str({"error": "No matching customer found in the database."})
+                
+            if len(customers) > 1:
+                found = f"{PROFILE_MATCH_LIMIT}+" if len(customers) > PROFILE_MATCH_LIMIT else str(len(customers))
+                return str({"error": f"Found {found} customers matching '{name_query}'. Please be more specific.", "matches": [c['name'] for c in customers[:PROFILE_MATCH_LIMIT]]})
+                
+            customer = customers[0]
+            customer_id = customer['id']
             
-        customer = customers[0]
-        customer_id = customer['id']
-        
-        # 2. Find Tickets
-        cur.execute("SELECT * FROM tickets WHERE customer_id = ? ORDER BY created_at DESC", (customer_id,))
-        tickets = [dict(row) for row in cur.fetchall()]
-        
-        # 3. Calculate Summary Stats
-        total_tickets = len(tickets)
-        open_tickets = sum(1 for t in tickets if t['status'] == 'Open')
-        closed_tickets = sum(1 for t in tickets if t['status'] == 'Closed')
-        high_priority = sum(1 for t in tickets if t['priority'] == 'High')
-        
-        conn.close()
+            # 2. Summary Stats, computed by SQLite in one pass over the customer's index range
+            cur.execute(SUMMARY_QUERY, (customer_id,))
+            summary = dict(cur.fetchone())
+            
+            # 3. One page of tickets (+ their interactions if asked)
+            tickets, next_cursor, ticket_query = _ticket_page(cur, customer_id, ticket_cursor)
+            if include_interactions:
+                _attach_interactions(cur, tickets)
         
         # 4. Construct Result
         result = {
             "customer": customer,
-            "tickets": tickets, # All tickets
-            "summary": {
-                "total": total_tickets,
-                "open": open_tickets,
-                "closed": closed_tickets,
-                "high_priority": high_priority
-            },
+            "tickets": tickets, # Most recent PROFILE_TICKET_LIMIT (after ticket_cursor)
+            "next_ticket_cursor": next_cursor,
+            "summary": summary,
             "_meta": {
-                "customer_query": f"SELECT * FROM customers WHERE name LIKE '%{name_query}%'",
-                "ticket_query": f"SELECT * FROM tickets WHERE customer_id = {customer_id} ORDER BY created_at DESC"
+                "customer_query": customer_query,
+                "summary_query": " ".join(SUMMARY_QUERY.split()),
+                "ticket_query": ticket_query
             }
         }
         
@@ -120,6 +285,3 @@ def get_customer_profile(name_query: str) -> str:
         
     except Exception as e:
         return f"ERROR: {type(e).__name__}: {e}"
-    finally:
-        if 'conn' in locals():
-            conn.close()
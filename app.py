@@ -3,12 +3,24 @@ import os
 import time
 import streamlit_shadcn_ui as ui
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
-from agents.graph import get_graph
+from agents.graph import get_graph, get_llm
+from services import warmup
+from services.index_jobs import index_jobs
 from ui_helpers import get_db_status, save_uploaded_file, list_indexed_files, get_lucide_script, lucide_icon
 
 # Page config
 st.set_page_config(page_title="Janvi Support", page_icon="⚛️", layout="wide", initial_sidebar_state="expanded")
 
+# Load the embedding model, vector store and LLM client in the background so the
+# first paint isn't blocked (no-op after the first run)
+warmup.start_warmup(extra_steps=[("llm", get_llm)])
+# Pick up indexing jobs interrupted by a restart (no-op once they are queued)
+index_jobs.resume()
+# Optional: auto-ingest PDFs dropped into data/policies (POLICY_WATCH=1)
+from services import policy_watcher
+if policy_watcher.POLICY_WATCH:
+    policy_watcher.start_background_watcher()
+
 # Inject Lucide Icons & Custom CSS
 st.markdown(get_lucide_script(), unsafe_allow_html=True)
 st.markdown("""
@@ -139,20 +151,59 @@ with st.sidebar:
             file_id = f"{uploaded_file.name}_{uploaded_file.size}"
             
             if file_id not in st.session_state.processed_files:
-                save_path = save_uploaded_file(uploaded_file)
-                st.toast(f"Uploaded: {uploaded_file.name}")
-                
-                with st.spinner(f"Indexing {uploaded_file.name}..."):
-                    from services.policy_engine import policy_engine
-                    res = policy_engine.index_file(uploaded_file.name)
-                    st.success(f"Indexed {res.get('chunks')} chunks!")
-                    
-                # Mark as processed
+                save_uploaded_file(uploaded_file)
+                # Indexing runs in the background job queue; progress is polled below
+                index_jobs.submit("index", uploaded_file.name)
+                st.toast(f"Uploaded: {uploaded_file.name}, indexing in background")
                 st.session_state.processed_files.add(file_id)
-                time.sleep(1)
-                st.rerun()
 
+        # 2. Background indexing jobs (polled without blocking the rest of the UI)
+        @st.fragment(run_every=1.0 if index_jobs.has_active() else None)
+        def _render_jobs():
+            active = index_jobs.list_jobs(active_only=True)
+            seen = st.session_state.setdefault("active_job_ids", set())
+            # A job finished since the last poll: rerun the whole app to refresh the document list
+            if seen - {job["id"] for job in active}:
+                finished = [index_jobs.get(job_id) for job_id in seen]
+                st.session_state.active_job_ids = {job["id"] for job in active}
+                for job in filter(None, finished):
+                    if job["status"] == "failed":
+                        st.toast(f"{job['filename']}: {job['error']}", icon="⚠️")
+                    elif job["status"] == "done" and job["kind"] == "index_batch":
+                        files = job["result"]["files"]
+                        indexed = sum(1 for r in files.values() if r["status"] == "success")
+                        st.toast(f"Indexed {indexed} changed file(s), {len(files) - indexed} unchanged", icon="🔄")
+                    elif job["status"] == "done" and job["kind"] == "index":
+                        res = job["result"]
+                        if res.get("status") == "unchanged":
+                            st.toast(f"{job['filename']}: no changes since last index.", icon="✅")
+                        else:
+                            st.toast(f"{job['filename']}: {res.get('added', 0)} new / {res.get('removed', 0)} removed chunks", icon="🔄")
+                    elif job["status"] == "done":
+                        st.toast(f"Deleted {job['filename']}", icon="🗑️")
+                time.sleep(0.5)
+                st.rerun(scope="app")
+            st.session_state.active_job_ids = {job["id"] for job in active}
 
+            for job in active:
+                progress = job["progress"]
+                label = "Deleting" if job["kind"] == "delete" else "Indexing"
+                text = f"{label} {job['filename']}: {job['status']}"
+                if job["kind"] == "index_batch":
+                    total = progress["total_files"]
+                    fraction = min(progress["files_done"] / total, 1.0) if total else 0.0
+                    if job["status"] == "running":
+                        text += f" · file {progress['files_done']}/{total} · {progress['chunks_embedded']} chunks embedded"
+                else:
+                    total = progress["total_pages"]
+                    fraction = min(progress["pages_done"] / total, 1.0) if total else 0.0
+                    if job["status"] == "running" and job["kind"] == "index":
+                        text += f" · page {progress['pages_done']}/{total or '?'} · {progress['chunks_embedded']} chunks embedded"
+                st.progress(fraction, text=text)
+                if job["kind"] == "index" and st.button("Cancel", key=f"cancel_{job['id']}", use_container_width=True):
+                    index_jobs.cancel(job["id"])
+
+        _render_jobs()
 
         st.divider()
         st.caption("Indexed Documents:")
@@ -178,17 +229,11 @@ with st.sidebar:
                     
                     # Vertical Chain of Actions
                     if st.button("Re-index", key=f"re_{doc_id}", use_container_width=True):
-                        with st.spinner("Re-indexing..."):
-                            policy_engine.index_file(filename)
-                        st.toast("Updated!", icon="🔄")
-                        time.sleep(0.5)
+                        index_jobs.submit("index", filename)
                         st.rerun()
                         
                     if st.button("Remove", key=f"del_{doc_id}", use_container_width=True):
-                        with st.spinner("Deleting..."):
-                            policy_engine.delete_file(filename)
-                        st.toast("Deleted!", icon="🗑️")
-                        time.sleep(0.5)
+                        index_jobs.submit("delete", filename)
                         st.rerun()
 
     st.divider()
@@ -196,7 +241,19 @@ with st.sidebar:
     # System Status Footer
     st.markdown("**System Status**")
     # FIX: Removed the 3rd argument 'fill' which caused the crash
-    st.markdown(f"{lucide_icon('circle', 'xs', 'fill-current text-green-500')} Online", unsafe_allow_html=True)
+    ready = warmup.is_ready()
+    dot = 'fill-current text-green-500' if ready else 'fill-current text-amber-500'
+    st.markdown(f"{lucide_icon('circle', 'xs', dot)} Online", unsafe_allow_html=True)
+    warm_status = warmup.get_status()
+    if ready:
+        st.caption(f"Models ready (warm-up {warm_status['steps'].get('total', '?')}s)")
+    elif warm_status["state"] == "failed":
+        st.caption(f"Warm-up failed: {warm_status['error']}")
+    else:
+        st.caption("Warming up models… first answer may be slower.")
+    startup_metrics = warm_status["metrics"]
+    if startup_metrics:
+        st.caption(" | ".join(f"{k.replace('_', ' ')}: {v}s" for k, v in startup_metrics.items()))
     st.caption("v1.0.1")
 
 # --- MAIN VIEW: CHAT ---
@@ -217,12 +274,15 @@ if not st.session_state.messages:
         cols = st.columns(3)
         if cols[0].button("List suspended customers", use_container_width=True):
             st.session_state.messages.append(HumanMessage(content="List suspended customers"))
+            st.session_state.prompt_submitted_at = time.time()
             st.rerun()
         if cols[1].button("Refund Policy", use_container_width=True):
              st.session_state.messages.append(HumanMessage(content="What is the refund policy?"))
+             st.session_state.prompt_submitted_at = time.time()
              st.rerun()
         if cols[2].button("Ema Patel Profile", use_container_width=True):
              st.session_state.messages.append(HumanMessage(content="Show me customer profile for Ema Patel"))
+             st.session_state.prompt_submitted_at = time.time()
              st.rerun()
 
 # Chat History
@@ -240,6 +300,7 @@ for message in st.session_state.messages:
 # Input Area
 if prompt := st.chat_input("Ask a question..."):
     st.session_state.messages.append(HumanMessage(content=prompt))
+    st.session_state.prompt_submitted_at = time.time()
     st.rerun()
 
 # Processing Logic (Hidden/Auto-run after rerun)
@@ -265,6 +326,8 @@ RULES:
                 # Run graph
                 result = st.session_state.agent_graph.invoke({"messages": messages_in}, config={"recursion_limit": 50})
                 full_history = result["messages"]
+                # From submitting the first question to its answer (waits on the warm-up if it is still running)
+                warmup.record_once("time_to_first_answer", since=st.session_state.get("prompt_submitted_at"))
                 
                 # Update session state with full history (excluding system)
                 st.session_state.messages = [m for m in full_history if not isinstance(m, SystemMessage)]
@@ -344,6 +407,23 @@ RULES:
                 # --- TRACE & DEBUG ---
                 with st.expander("Inspect Trace & Debug"):
                     st.caption(f"**Retrieval Stats:** {retrieval_debug}")
+                    from services.retriever_registry import get_cache_stats
+                    from agents.utils_sql import sql_result_cache
+                    for cache_name, stats in {**get_cache_stats(), "sql_results": sql_result_cache.stats()}.items():
+                        if "maxsize" in stats:
+                            capacity = f"{stats['size']}/{stats['maxsize']} entries"
+                        else:
+                            capacity = f"{stats['size']} entries, {stats['size_mb']}/{stats['max_mb']} MB on disk"
+                        st.caption(
+                            f"**Cache ({cache_name}):** {stats['hits']} hits / {stats['misses']} misses "
+                            f"({stats['hit_rate']:.0%}), {stats['evictions']} evictions, {capacity}"
+                        )
+                    from services.db_pool import read_pool
+                    pool = read_pool.stats()
+                    st.caption(
+                        f"**SQL connections:** {pool['open']} open, {pool['opened']} opened for {pool['checkouts']} "
+                        f"queries ({pool['reuse_rate']:.0%} reused), avg connect {pool['avg_connect_ms']} ms"
+                    )
                     st.caption("Agent execution trace:")
                     if tool_data:
                         # If it's a list of dicts string representation, code block is good
@@ -355,3 +435,6 @@ RULES:
                 message_placeholder.error(f"Error: {e}")
                 # Remove the failed message to prevent stuck state
                 st.session_state.messages.pop()
+
+# Startup metric: end of the first full script run is the first complete paint
+warmup.record_once("time_to_first_paint")
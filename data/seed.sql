@@ -1,3 +1,6 @@
+-- Search index over customers (created by scripts/init_db.py)
+DROP TABLE IF EXISTS customers_fts;
+
 -- Customers Table
 DROP TABLE IF EXISTS customers;
 CREATE TABLE customers (
@@ -23,6 +26,10 @@ CREATE TABLE tickets (
     FOREIGN KEY (customer_id) REFERENCES customers(id)
 );
 
+-- Profile lookups list a customer's tickets newest first; dashboards filter by status/priority
+CREATE INDEX idx_tickets_customer_created ON tickets(customer_id, created_at);
+CREATE INDEX idx_tickets_status_priority ON tickets(status, priority);
+
 -- Interactions Table
 DROP TABLE IF EXISTS interactions;
 CREATE TABLE interactions (
@@ -33,6 +40,7 @@ CREATE TABLE interactions (
     created_at TEXT,
     FOREIGN KEY (ticket_id) REFERENCES tickets(id)
 );
+CREATE INDEX idx_interactions_ticket ON interactions(ticket_id, created_at);
 
 -- Insert Customers
 INSERT INTO customers (name, email, phone, account_status, created_at) VALUES
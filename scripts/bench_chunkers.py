@@ -0,0 +1,122 @@
+"""
+Compare the structural and recursive chunkers on the policy PDFs.
+
+Pages are extracted once; each chunker then splits them, the chunks are
+embedded with the configured model (no embedding cache, so timings are fair)
+and a set of questions is answered by exact cosine top-k. A question counts
+as a hit when one of the top-k chunks contains its expected answer text.
+
+Usage:
+    python scripts/bench_chunkers.py --k 3
+    python scripts/bench_chunkers.py --dir data/policies --queries eval.jsonl
+
+eval.jsonl holds one {"question": ..., "answer": ...} object per line; without
+it a built-in set for the sample refund policy (scripts/create_dummy_pdf.py) is used.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chunking import get_splitter, count_tokens
+from services.embeddings import build_embeddings
+
+DEFAULT_QUERIES = [
+    {"question": "How long do I have to ask for a refund?", "answer": "within 30 days of purchase"},
+    {"question": "Does the product need to be unused to get my money back?", "answer": "must be unused"},
+    {"question": "Can I get a refund on a gift card?", "answer": "Gift cards"},
+    {"question": "Are downloadable software products refundable?", "answer": "Downloadable software products"},
+    {"question": "Will I get an email when my return is received?", "answer": "send you an email"},
+    {"question": "Where does the refund credit go?", "answer": "original method of payment"},
+    {"question": "My refund has not arrived, what should I check first?", "answer": "check your bank account"},
+    {"question": "Who do I contact if I still have not received my refund?", "answer": "support@example.com"},
+]
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def load_pages(directory: str):
+    from langchain_community.document_loaders import PyPDFLoader
+    pages = []
+    for filename in sorted(f for f in os.listdir(directory) if f.endswith(".pdf")):
+        pages.extend(PyPDFLoader(os.path.join(directory, filename)).load())
+    return pages
+
+
+def run(chunker: str, pages, queries, embeddings, k: int) -> dict:
+    started = time.perf_counter()
+    chunks = get_splitter(chunker).split_documents(pages)
+    split_s = time.perf_counter() - started
+
+    texts = [c.page_content for c in chunks]
+    started = time.perf_counter()
+    matrix = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    embed_s = time.perf_counter() - started
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+
+    query_vectors = np.asarray(embeddings.embed_documents([q["question"] for q in queries]), dtype=np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True) + 1e-12
+    ranked = np.argsort(-(query_vectors @ matrix.T), axis=1)[:, :k]
+    hits = reciprocal_ranks = 0.0
+    for q, rows in zip(queries, ranked):
+        answer = _normalize(q["answer"])
+        rank = next((r for r, row in enumerate(rows, start=1) if answer in _normalize(texts[row])), None)
+        if rank:
+            hits += 1
+            reciprocal_ranks += 1.0 / rank
+
+    tokens = [count_tokens(t) for t in texts]
+    return {
+        "chunker": chunker,
+        "chunks": len(chunks),
+        "avg_tokens": round(float(np.mean(tokens)), 1) if tokens else 0,
+        "max_tokens": max(tokens, default=0),
+        "embedded_tokens": sum(tokens),
+        "split_ms": round(split_s * 1000, 1),
+        "embed_s": round(embed_s, 2),
+        f"hit@{k}": f"{hits / len(queries):.0%}",
+        "mrr": round(reciprocal_ranks / len(queries), 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default="data/policies")
+    parser.add_argument("--queries", help="JSONL file of {question, answer}")
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, "r") as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+
+    pages = load_pages(args.dir)
+    if not pages:
+        print(f"No PDFs found in {args.dir}.")
+        return
+    print(f"{len(pages)} page(s), {len(queries)} question(s)")
+    embeddings = build_embeddings()
+    # Warm-up so model loading isn't charged to the first chunker
+    embeddings.embed_documents(["warm-up"])
+
+    rows = [run(chunker, pages, queries, embeddings, args.k) for chunker in ("recursive", "structural")]
+    headers = list(rows[0])
+    print("\n" + " | ".join(headers))
+    for row in rows:
+        print(" | ".join(str(row[h]) for h in headers))
+
+
+if __name__ == "__main__":
+    main()
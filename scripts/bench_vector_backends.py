@@ -0,0 +1,131 @@
+"""
+Benchmark the Chroma and NumPy (memory-mapped) vector backends.
+
+Each backend is built once from the same synthetic corpus, then measured in a
+fresh subprocess so cold-open time and peak RSS are not polluted by the other.
+
+Usage:
+    python scripts/bench_vector_backends.py --chunks 5000 --queries 200
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import subprocess
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.vector_backends import ChromaBackend, NumpyBackend
+
+DIM = 384  # all-MiniLM-L6-v2
+
+
+def _corpus(n_chunks: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n_chunks, DIM)).astype(np.float32)
+    ids = [f"doc{i // 50}_{i}" for i in range(n_chunks)]
+    texts = [f"Synthetic policy chunk {i} " + "lorem ipsum " * 80 for i in range(n_chunks)]
+    metadatas = [{"doc_id": f"doc{i // 50}", "doc_name": f"doc{i // 50}.pdf", "page": 1 + i % 10, "chunk_id": ids[i]}
+                 for i in range(n_chunks)]
+    return ids, vectors, texts, metadatas
+
+
+def _open(backend: str, path: str, dtype: str):
+    if backend == "chroma":
+        return ChromaBackend(embeddings=None, persist_directory=path)
+    return NumpyBackend(embeddings=None, path=path, dtype=dtype)
+
+
+def build(backend: str, path: str, dtype: str, n_chunks: int):
+    ids, vectors, texts, metadatas = _corpus(n_chunks)
+    store = _open(backend, path, dtype)
+    if backend == "chroma":
+        # Chroma caps the batch size per add call
+        for start in range(0, n_chunks, 5000):
+            end = start + 5000
+            store.store._collection.add(ids=ids[start:end], embeddings=vectors[start:end].tolist(),
+                                        documents=texts[start:end], metadatas=metadatas[start:end])
+    else:
+        store.add_embeddings(ids, vectors.tolist(), texts, metadatas)
+
+
+def measure(backend: str, path: str, dtype: str, n_queries: int) -> dict:
+    started = time.perf_counter()
+    store = _open(backend, path, dtype)
+    cold_open = time.perf_counter() - started
+
+    queries = np.random.default_rng(1).normal(size=(n_queries, DIM)).astype(np.float32).tolist()
+    first = time.perf_counter()
+    store.search_by_vector(queries[0], k=10)
+    first_query = time.perf_counter() - first
+
+    latencies = []
+    for q in queries:
+        t = time.perf_counter()
+        store.search_by_vector(q, k=10)
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    return {
+        "backend": backend if backend == "chroma" else f"numpy-{dtype}",
+        "cold_open_ms": round(cold_open * 1000, 1),
+        "first_query_ms": round(first_query * 1000, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "peak_rss_mb": round(rss_mb, 1),
+        "disk_mb": round(sum(os.path.getsize(os.path.join(root, f))
+                             for root, _, files in os.walk(path) for f in files) / (1024 * 1024), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    # Internal: run a single measurement in this process
+    parser.add_argument("--measure", choices=["chroma", "numpy"])
+    parser.add_argument("--path")
+    parser.add_argument("--dtype", default="float16")
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.path, args.dtype, args.queries)))
+        return
+
+    workdir = tempfile.mkdtemp(prefix="vector_bench_")
+    try:
+        rows = []
+        for backend, dtype in [("chroma", None), ("numpy", "float16"), ("numpy", "int8")]:
+            path = os.path.join(workdir, f"{backend}_{dtype}")
+            print(f"Building {backend} {dtype or ''} with {args.chunks} chunks...")
+            started = time.perf_counter()
+            build(backend, path, dtype or "float16", args.chunks)
+            build_s = time.perf_counter() - started
+
+            out = subprocess.run(
+                [sys.executable, __file__, "--measure", backend, "--path", path,
+                 "--dtype", dtype or "float16", "--queries", str(args.queries)],
+                capture_output=True, text=True, check=True
+            )
+            row = json.loads(out.stdout.strip().splitlines()[-1])
+            row["build_s"] = round(build_s, 2)
+            rows.append(row)
+
+        headers = ["backend", "build_s", "cold_open_ms", "first_query_ms", "p50_ms", "p95_ms", "peak_rss_mb", "disk_mb"]
+        print("\n" + " | ".join(headers))
+        for row in rows:
+            print(" | ".join(str(row[h]) for h in headers))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,149 @@
+"""
+Bulk-ingest every PDF in data/policies through PolicyEngine.
+
+Incremental by default: unchanged files are skipped by content hash, removed
+files are dropped from the index, and only new/changed chunks are embedded.
+Files are processed in groups; each file is recorded in a checkpoint as soon as
+its index entry is committed, so an interrupted run continues where it stopped
+with --resume.
+
+Usage:
+    python scripts/ingest_docs.py --workers 4 --batch-size 256
+    python scripts/ingest_docs.py --resume
+    python scripts/ingest_docs.py --dry-run
+    python scripts/ingest_docs.py --force        # full blue/green rebuild
+"""
 import os
-import shutil
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
+import sys
+import json
+import time
+import argparse
+from typing import Dict
+
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables before the services read their settings
 load_dotenv()
 
-DATA_PATH = "data/policies"
-CHROMA_PATH = "data/chroma_db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.policy_engine import policy_engine, POLICIES_DIR, INDEX_WORKERS, UPSERT_BATCH_SIZE
+from services.retriever_registry import get_embeddings
+
+CHECKPOINT_FILE = "data/ingest_checkpoint.json"
+# Files parsed + embedded per index_files call
+GROUP_SIZE = 32
+
+
+def _file_signature(filename: str) -> list:
+    stat = os.stat(os.path.join(POLICIES_DIR, filename))
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _load_checkpoint() -> Dict:
+    if os.path.exists(CHECKPOINT_FILE):
+        with open(CHECKPOINT_FILE, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def _save_checkpoint(checkpoint: Dict):
+    tmp_path = f"{CHECKPOINT_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, CHECKPOINT_FILE)
+
+
+def dry_run(files):
+    statuses = policy_engine.check_files(files)
+    for filename, status in statuses.items():
+        print(f"  {status:<10} {filename}")
+    removed = policy_engine.prune_missing(files, dry_run=True)
+    for filename in removed:
+        print(f"  {'removed':<10} {filename}")
+    todo = sum(1 for s in statuses.values() if s in ("new", "modified"))
+    print(f"Dry run: {todo} file(s) to index, {len(files) - todo} unchanged/unreadable, {len(removed)} to remove.")
+
 
 def main():
-    # Check if Groq API key is set
-    if not os.getenv("GROQ_API_KEY"):
-        print("Error: GROQ_API_KEY environment variable not set.")
+    parser = argparse.ArgumentParser(description="Ingest policy PDFs into the vector store.")
+    parser.add_argument("--workers", type=int, default=INDEX_WORKERS, help="PDF parser processes")
+    parser.add_argument("--batch-size", type=int, default=UPSERT_BATCH_SIZE, help="chunks per embed/upsert call")
+    parser.add_argument("--group-size", type=int, default=GROUP_SIZE, help="files per parse/embed round")
+    parser.add_argument("--resume", action="store_true", help="skip files finished by the previous, interrupted run")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be indexed or removed")
+    parser.add_argument("--force", action="store_true", help="re-embed everything (blue/green rebuild)")
+    args = parser.parse_args()
+
+    files = policy_engine.list_policy_files()
+    if not files:
+        print(f"No documents found in {POLICIES_DIR}.")
         return
+    print(f"Found {len(files)} PDF(s) in {POLICIES_DIR}.")
 
-    # Clear existing vector store if it exists (since embeddings are changing)
-    if os.path.exists(CHROMA_PATH):
-        print(f"Removing existing vector store at {CHROMA_PATH}...")
-        shutil.rmtree(CHROMA_PATH)
-
-    # Load documents
-    print(f"Loading documents from {DATA_PATH}...")
-    loader = PyPDFDirectoryLoader(DATA_PATH)
-    documents = loader.load()
-    if not documents:
-        print("No documents found.")
+    if args.dry_run:
+        dry_run(files)
         return
-    print(f"Loaded {len(documents)} documents.")
-
-    # Split text
-    print("Splitting documents...")
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len,
-        is_separator_regex=False,
-    )
-    chunks = text_splitter.split_documents(documents)
-    print(f"Split into {len(chunks)} chunks.")
-
-    # Create embeddings and store in Chroma
-    print("Creating embeddings and storing in Chroma...")
-    # Using HuggingFace Embeddings (Free, runs locally)
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    
-    # Initialize Chroma
-    db = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        persist_directory=CHROMA_PATH
+
+    started = time.perf_counter()
+    if args.force:
+        results = policy_engine.reset_all(force=True, workers=args.workers)
+        print("\n".join(results))
+        stats = policy_engine.last_rebuild_stats
+        print(f"Rebuilt {stats['parsed_files']}/{stats['files']} files in {stats['total_seconds']}s "
+              f"({stats['pages_per_sec']} pages/sec, {stats['chunks_per_sec']} chunks/sec)")
+        return
+
+    checkpoint = _load_checkpoint() if args.resume else {}
+    done = checkpoint.get("done", {})
+    if args.resume and done:
+        # Only trust entries for files that haven't changed since
+        done = {f: sig for f, sig in done.items() if f in files and sig == _file_signature(f)}
+        print(f"Resuming: {len(done)} file(s) already done in the interrupted run.")
+    resumed = len(done)
+    checkpoint = {"started_at": checkpoint.get("started_at", time.time()), "done": dict(done), "failed": {}}
+
+    removed = policy_engine.prune_missing(files)
+    if removed:
+        print(f"Removed {len(removed)} document(s) whose file is gone: {', '.join(removed)}")
+
+    todo = [f for f in files if f not in done]
+    totals = {"indexed": 0, "unchanged": 0, "failed": 0, "pages": 0, "embedded_chunks": 0,
+              "parse_seconds": 0.0, "embed_seconds": 0.0}
+    def _record(filename, result):
+        # Called per file as soon as its result is committed, so a crash loses at most the files in flight
+        if result["status"] == "error":
+            totals["failed"] += 1
+            checkpoint["failed"][filename] = result.get("message")
+            print(f"  failed     {filename}: {result.get('message')}")
+        else:
+            totals["indexed" if result["status"] == "success" else "unchanged"] += 1
+            checkpoint["done"][filename] = _file_signature(filename)
+        _save_checkpoint(checkpoint)
+
+    for start in range(0, len(todo), args.group_size):
+        group = todo[start:start + args.group_size]
+        run = policy_engine.index_files(group, workers=args.workers, batch_size=args.batch_size, on_result=_record)
+        for key in ("pages", "embedded_chunks", "parse_seconds", "embed_seconds"):
+            totals[key] += run["stats"][key]
+        print(f"Progress: {min(start + len(group), len(todo))}/{len(todo)} files")
+
+    total_seconds = time.perf_counter() - started
+    cache = get_embeddings().cache.stats()
+    print(
+        f"\nIngested {len(files)} file(s) in {total_seconds:.1f}s: "
+        f"{totals['indexed']} indexed, {totals['unchanged']} unchanged, {resumed} resumed, "
+        f"{totals['failed']} failed, {len(removed)} removed\n"
+        f"  parse:  {totals['pages']} pages in {totals['parse_seconds']:.1f}s "
+        f"({totals['pages'] / totals['parse_seconds'] if totals['parse_seconds'] else 0:.1f} pages/sec)\n"
+        f"  embed:  {totals['embedded_chunks']} chunks in {totals['embed_seconds']:.1f}s "
+        f"({totals['embedded_chunks'] / totals['embed_seconds'] if totals['embed_seconds'] else 0:.1f} chunks/sec)\n"
+        f"  embedding cache: {cache['hits']} hits / {cache['misses']} misses ({cache['hit_rate']:.0%})"
     )
-    
-    print(f"Documents ingested successfully into {CHROMA_PATH}.")
+    if not totals["failed"] and os.path.exists(CHECKPOINT_FILE):
+        # Clean finish: nothing left to resume
+        os.remove(CHECKPOINT_FILE)
+
 
 if __name__ == "__main__":
     main()
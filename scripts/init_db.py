@@ -4,6 +4,34 @@ import os
 DB_PATH = "data/database.sqlite"
 SEED_PATH = "data/seed.sql"
 
+# Trigram full-text index over customer name/email for get_customer_profile.
+# External content (no second copy of the rows), kept in sync by triggers.
+# Needs SQLite >= 3.34 with FTS5; without it the tool falls back to LIKE.
+SEARCH_SCHEMA = """
+DROP TABLE IF EXISTS customers_fts;
+CREATE VIRTUAL TABLE customers_fts USING fts5(
+    name, email, content='customers', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER customers_fts_insert AFTER INSERT ON customers BEGIN
+    INSERT INTO customers_fts (rowid, name, email) VALUES (new.id, new.name, new.email);
+END;
+CREATE TRIGGER customers_fts_delete AFTER DELETE ON customers BEGIN
+    INSERT INTO customers_fts (customers_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email);
+END;
+CREATE TRIGGER customers_fts_update AFTER UPDATE OF name, email ON customers BEGIN
+    INSERT INTO customers_fts (customers_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email);
+    INSERT INTO customers_fts (rowid, name, email) VALUES (new.id, new.name, new.email);
+END;
+INSERT INTO customers_fts (customers_fts) VALUES ('rebuild');
+"""
+
+def create_search_index(conn):
+    try:
+        conn.executescript(SEARCH_SCHEMA)
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        print(f"Warning: customer search index not created ({e}); lookups will use LIKE scans.")
+
 def init_db():
     if not os.path.exists("data"):
         os.makedirs("data")
@@ -18,6 +46,7 @@ def init_db():
     try:
         cursor.executescript(sql_script)
         conn.commit()
+        create_search_index(conn)
         print("Database initialized successfully with seed data.")
     except Exception as e:
         print(f"Error initializing database: {e}")
@@ -0,0 +1,46 @@
+from langchain_core.documents import Document
+
+from services.context_packing import pack_context
+
+BOILERPLATE = ("Refunds are issued to the original payment method within 14 business days "
+               "of receiving the returned item in its original condition.")
+
+
+def _doc(text, doc_name, page, also_cited=None, sub_queries=None):
+    metadata = {"doc_id": doc_name, "doc_name": doc_name, "page": page, "sub_queries": sub_queries or []}
+    if also_cited is not None:
+        metadata["also_cited"] = also_cited
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_dropped_duplicate_keeps_back_references():
+    docs = [
+        _doc(BOILERPLATE, "eu.pdf", 2, sub_queries=["eu refunds"]),
+        # Same clause from another policy, already carrying the dedup back-references
+        _doc(BOILERPLATE + " ", "uk.pdf", 4, also_cited=["us.pdf (p. 3)", "ca.pdf (p. 9)"],
+             sub_queries=["uk refunds"]),
+    ]
+    packed, stats = pack_context(docs)
+    assert stats["dropped_duplicates"] == 1
+    assert packed[0].metadata["also_cited"] == ["uk.pdf (p. 4)", "us.pdf (p. 3)", "ca.pdf (p. 9)"]
+    assert packed[0].metadata["sub_queries"] == ["eu refunds", "uk refunds"]
+
+
+def test_merged_chunk_keeps_back_references():
+    first, second = BOILERPLATE[:100], BOILERPLATE[60:]
+    docs = [
+        _doc(first, "uk.pdf", 4, also_cited=["us.pdf (p. 3)"]),
+        _doc(second, "uk.pdf", 4, also_cited=["ca.pdf (p. 9)", "uk.pdf (p. 4)"]),
+    ]
+    packed, stats = pack_context(docs)
+    assert stats["merged_chunks"] == 1
+    assert packed[0].page_content == BOILERPLATE
+    assert packed[0].metadata["also_cited"] == ["us.pdf (p. 3)", "ca.pdf (p. 9)"]
+    # Inputs may be shared with the retrieval cache and must stay untouched
+    assert docs[0].metadata["also_cited"] == ["us.pdf (p. 3)"]
+
+
+if __name__ == "__main__":
+    test_dropped_duplicate_keeps_back_references()
+    test_merged_chunk_keeps_back_references()
+    print("context packing OK")
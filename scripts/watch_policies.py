@@ -0,0 +1,39 @@
+"""
+Watch data/policies and keep the index in sync with it.
+
+Added, modified and removed PDFs are picked up automatically; bursts of changes
+(e.g. copying hundreds of files in) are debounced and ingested as one batched
+incremental update.
+
+Usage:
+    python scripts/watch_policies.py --interval 2 --debounce 5
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.policy_watcher import PolicyWatcher, WATCH_INTERVAL, WATCH_DEBOUNCE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Auto-ingest PDFs dropped into the policies folder.")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="seconds between scans")
+    parser.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE, help="quiet seconds before ingesting a burst")
+    parser.add_argument("--no-initial-sync", action="store_true", help="don't reconcile the folder with the index on start")
+    parser.add_argument("--once", action="store_true", help="sync once and exit")
+    args = parser.parse_args()
+
+    watcher = PolicyWatcher(interval=args.interval, debounce=args.debounce)
+    if args.once:
+        watcher.sync()
+        return
+    try:
+        watcher.run(initial_sync=not args.no_initial_sync)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import os
+import re
+import math
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from services.embeddings import EMBEDDING_MODEL
+
+# Constants
+# "structural" (sections/headings, token-capped, no overlap) or "recursive" (the original splitter)
+CHUNKER = os.getenv("CHUNKER", "structural")
+# Recursive splitter settings (characters)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Structural chunks are capped in word pieces ([CLS]/[SEP] not included).
+# all-MiniLM-L6-v2 truncates its input at 256, so anything past that would never be embedded
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+# How chunk sizes are counted: "estimate" (no dependencies) or "wordpiece" (the
+# model's own tokenizer; needs transformers). Part of the chunker signature, so
+# it is a config choice and never depends on what happens to load at runtime.
+CHUNK_TOKEN_COUNTER = os.getenv("CHUNK_TOKEN_COUNTER", "estimate")
+# The estimate counts words longer than this many characters as one piece per
+# CHARS_PER_PIECE characters (errs high on real text)
+ESTIMATE_WORD_CHARS = 6
+CHARS_PER_PIECE = 4
+# Headings longer than this many words are treated as body text
+HEADING_MAX_WORDS = 12
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_NUMBERED_RE = re.compile(r"^(\d+(\.\d+)*[.)]|\d+(\.\d+)+|[IVXLC]+[.)]|[A-Z][.)])\s+[A-Z]")
+_KEYWORD_RE = re.compile(r"^(section|article|chapter|part|appendix|schedule)\s+[\dIVXLC]+\b", re.IGNORECASE)
+_BULLET_RE = re.compile(r"^([-*•▪●]|\d+[.)]|[a-z][.)]|\([a-z0-9]+\))\s")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+@lru_cache(maxsize=1)
+def _tokenizer():
+    """The embedding model's WordPiece tokenizer (CHUNK_TOKEN_COUNTER=wordpiece)."""
+    try:
+        from transformers import AutoTokenizer
+    except ImportError:
+        raise ImportError(
+            "CHUNK_TOKEN_COUNTER=wordpiece needs transformers: pip install transformers"
+        ) from None
+    name = EMBEDDING_MODEL if "/" in EMBEDDING_MODEL else f"sentence-transformers/{EMBEDDING_MODEL}"
+    return AutoTokenizer.from_pretrained(name)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Word pieces the embedding model sees for `text`, as configured by
+    CHUNK_TOKEN_COUNTER: the model's tokenizer, or an estimate that counts every
+    word and punctuation mark, and long words as several pieces.
+    Both are additive over whitespace-separated words.
+    """
+    if CHUNK_TOKEN_COUNTER == "wordpiece":
+        return len(_tokenizer().tokenize(text))
+    return sum(1 if len(token) <= ESTIMATE_WORD_CHARS else math.ceil(len(token) / CHARS_PER_PIECE)
+               for token in _TOKEN_RE.findall(text))
+
+
+def is_heading(line: str) -> bool:
+    """Numbered section ("2. Non-refundable Items", "4.1 Scope"), keyword ("Section 3"), markdown or ALL CAPS line."""
+    line = line.strip()
+    if not line or len(line.split()) > HEADING_MAX_WORDS or line[-1] in ".,;":
+        return False
+    if line.startswith("#") or _NUMBERED_RE.match(line) or _KEYWORD_RE.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 3 and all(c.isupper() for c in letters)
+
+
+def chunker_signature(chunker: str = CHUNKER) -> str:
+    """Identifies the chunking an index was built with; changing it re-chunks every file."""
+    if chunker == "structural":
+        return f"structural:{CHUNK_MAX_TOKENS}:{CHUNK_TOKEN_COUNTER}"
+    return f"recursive:{CHUNK_SIZE}:{CHUNK_OVERLAP}"
+
+
+class StructuralSplitter:
+    """
+    Splits page text at section headings instead of every N characters: whole
+    consecutive sections are packed into a chunk while they fit in max_tokens,
+    so "1. Eligibility for Refunds" never ends halfway into "2. Non-refundable Items".
+    A section over max_tokens on its own is split between items/sentences (never
+    mid-word unless a single sentence is too long); continuation pieces repeat
+    the heading instead of overlapping text, and are sized so that heading plus
+    text stay within max_tokens. Same split_documents() interface as
+    the LangChain splitters, and pages are split one at a time, so chunks never
+    cross a page boundary either.
+    """
+
+    def __init__(self, max_tokens: int = CHUNK_MAX_TOKENS):
+        self.max_tokens = max_tokens
+
+    def _sections(self, text: str) -> List[Tuple[Optional[str], List[str]]]:
+        """(heading, items) per section. Items are bullets/paragraphs with PDF line wraps rejoined."""
+        sections: List[Tuple[Optional[str], List[str]]] = [(None, [])]
+        for raw in text.splitlines():
+            line = raw.strip()
+            if not line:
+                # Paragraph break: next line starts a new item
+                if sections[-1][1] and sections[-1][1][-1]:
+                    sections[-1][1].append("")
+                continue
+            if is_heading(line):
+                sections.append((line, []))
+                continue
+            items = sections[-1][1]
+            if items and items[-1] and not _BULLET_RE.match(line):
+                items[-1] = f"{items[-1]} {line}"  # wrapped line
+            elif items and not items[-1]:
+                items[-1] = line
+            else:
+                items.append(line)
+        return [(heading, [i for i in items if i]) for heading, items in sections if heading or any(items)]
+
+    def _pieces(self, item: str, budget: int) -> List[str]:
+        """Split one over-long item into sentences, and sentences into word runs if needed."""
+        if count_tokens(item) <= budget:
+            return [item]
+        pieces = []
+        for sentence in _SENTENCE_RE.split(item):
+            if count_tokens(sentence) <= budget:
+                pieces.append(sentence)
+                continue
+            current, used = [], 0
+            for word in sentence.split():
+                size = count_tokens(word)
+                if current and used + size > budget:
+                    pieces.append(" ".join(current))
+                    current, used = [], 0
+                current.append(word)
+                used += size
+            if current:
+                pieces.append(" ".join(current))
+        return pieces
+
+    def _pack(self, heading: Optional[str], items: List[str]) -> List[str]:
+        """Split one section into pieces of at most max_tokens; later pieces repeat its heading."""
+        heading_size = count_tokens(heading) if heading else 0
+        if heading_size > self.max_tokens // 2:
+            # Too long to repeat: pack it like any other text
+            heading, heading_size, items = None, 0, [heading] + items
+        # Every piece must fit next to the heading it is packed with
+        budget = max(1, self.max_tokens - heading_size)
+        chunks, current = [], [heading] if heading else []
+        used = heading_size
+        for item in items:
+            for piece in self._pieces(item, budget):
+                size = count_tokens(piece)
+                if used + size > self.max_tokens and len(current) > (1 if heading else 0):
+                    chunks.append("\n".join(current))
+                    current = [heading] if heading else []
+                    used = heading_size
+                current.append(piece)
+                used += size
+        if current:
+            chunks.append("\n".join(current))
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        chunks: List[str] = []
+        current: List[str] = []
+        used = 0
+        for heading, items in self._sections(text):
+            for piece in self._pack(heading, items):
+                size = count_tokens(piece)
+                if current and used + size > self.max_tokens:
+                    chunks.append("\n".join(current))
+                    current, used = [], 0
+                current.append(piece)
+                used += size
+        if current:
+            chunks.append("\n".join(current))
+        return chunks
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        chunks = []
+        for doc in documents:
+            for text in self.split_text(doc.page_content):
+                metadata = dict(doc.metadata)
+                heading = next((line for line in text.split("\n") if is_heading(line)), None)
+                if heading:
+                    metadata["section"] = heading
+                chunks.append(Document(page_content=text, metadata=metadata))
+        return chunks
+
+
+def get_splitter(chunker: str = CHUNKER):
+    """Text splitter used by every ingestion path (see services/pdf_parsing.py)."""
+    if chunker == "structural":
+        return StructuralSplitter()
+    if chunker != "recursive":
+        raise ValueError(f"Unknown CHUNKER {chunker!r} (expected 'structural' or 'recursive')")
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len
+    )
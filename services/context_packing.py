@@ -0,0 +1,149 @@
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# Default token budget for the policy context handed to the LLM
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "700"))
+# Chunks sharing at least this many characters at their seam are stitched together
+MIN_MERGE_OVERLAP = 20
+# Word-shingle Jaccard similarity above which a chunk counts as a near-duplicate
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# Don't bother appending a truncated chunk smaller than this
+MIN_TRUNCATED_TOKENS = 40
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English with Llama tokenizers)."""
+    return len(text) // 4 + 1
+
+
+def _clean(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _citation(doc: Document) -> str:
+    source = doc.metadata.get("doc_name", os.path.basename(doc.metadata.get("source", "Unknown")))
+    return f"{source} (p. {doc.metadata.get('page', 'N/A')})"
+
+
+def _location(doc: Document) -> Tuple:
+    return (doc.metadata.get("doc_id") or doc.metadata.get("source"), doc.metadata.get("page"))
+
+
+def _seam_overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of left that is a prefix of right."""
+    for size in range(min(len(left), len(right)), MIN_MERGE_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _try_merge(a: str, b: str) -> Optional[str]:
+    """Stitch two chunks from the same page if one contains the other or they overlap at a seam."""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    overlap = _seam_overlap(a, b)
+    if overlap:
+        return a + b[overlap:]
+    overlap = _seam_overlap(b, a)
+    if overlap:
+        return b + a[overlap:]
+    return None
+
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = text.lower().split()
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _union(first: List, second: List) -> List:
+    return first + [item for item in second if item not in first]
+
+
+def _absorb(kept: Document, candidate: Document, citations: List[str]):
+    """Carry a merged/dropped chunk's citations and sub-queries over to the chunk that stays."""
+    own = _citation(kept)
+    kept.metadata["also_cited"] = _union(kept.metadata["also_cited"], [c for c in citations if c != own])
+    kept.metadata["sub_queries"] = _union(kept.metadata.get("sub_queries", []),
+                                          candidate.metadata.get("sub_queries", []))
+
+
+def pack_context(docs: List[Document], token_budget: int = CONTEXT_TOKEN_BUDGET) -> Tuple[List[Document], Dict]:
+    """
+    Shrink retrieved chunks before they go into the prompt:
+    1. Stitch overlapping chunks from the same doc and page (the splitter repeats 200 chars).
+    2. Drop near-duplicates, keeping their citations on the surviving chunk ("also_cited").
+    3. Fill the token budget in relevance order, truncating the last chunk if worthwhile.
+    Input documents are never mutated (they may be shared with the retrieval cache).
+    Returns (packed documents, stats).
+    """
+    tokens_in = sum(estimate_tokens(d.page_content) for d in docs)
+    packed: List[Document] = []
+    merged = dropped = 0
+
+    for doc in docs:
+        candidate = Document(page_content=_clean(doc.page_content), metadata=dict(doc.metadata))
+        candidate.metadata["also_cited"] = list(candidate.metadata.get("also_cited") or [])
+
+        # 1. Merge with an already-kept chunk from the same doc and page
+        target = None
+        for kept in packed:
+            if _location(kept) == _location(candidate):
+                stitched = _try_merge(kept.page_content, candidate.page_content)
+                if stitched is not None:
+                    kept.page_content = stitched
+                    target = kept
+                    break
+        if target is not None:
+            _absorb(target, candidate, candidate.metadata["also_cited"])
+            merged += 1
+            continue
+
+        # 2. Near-duplicate of something already kept (e.g. the same clause in another policy)
+        shingles = _shingles(candidate.page_content)
+        duplicate_of = next(
+            (kept for kept in packed if _jaccard(_shingles(kept.page_content), shingles) >= NEAR_DUPLICATE_THRESHOLD),
+            None
+        )
+        if duplicate_of is not None:
+            _absorb(duplicate_of, candidate, [_citation(candidate)] + candidate.metadata["also_cited"])
+            dropped += 1
+            continue
+
+        packed.append(candidate)
+
+    # 3. Budget fill in relevance order
+    budgeted: List[Document] = []
+    used = 0
+    for doc in packed:
+        cost = estimate_tokens(doc.page_content)
+        if used + cost <= token_budget:
+            budgeted.append(doc)
+            used += cost
+            continue
+        remaining = token_budget - used
+        # Always return something, even if the top chunk alone exceeds the budget
+        if remaining >= MIN_TRUNCATED_TOKENS or not budgeted:
+            doc.page_content = doc.page_content[:max(remaining, MIN_TRUNCATED_TOKENS) * 4].rstrip() + " ..."
+            budgeted.append(doc)
+            used += estimate_tokens(doc.page_content)
+        break
+
+    return budgeted, {
+        "tokens_in": tokens_in,
+        "tokens_out": used,
+        "token_budget": token_budget,
+        "merged_chunks": merged,
+        "dropped_duplicates": dropped,
+        "budget_cut": len(packed) - len(budgeted)
+    }
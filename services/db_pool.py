@@ -0,0 +1,150 @@
+import os
+import time
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+# Constants
+DB_PATH = "data/database.sqlite"
+# Memory-map up to this many bytes of the database file (0 disables)
+SQL_MMAP_SIZE = int(os.getenv("SQL_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Page cache per connection, in KiB
+SQL_CACHE_KB = int(os.getenv("SQL_CACHE_KB", "16384"))
+# Prepared statements kept per connection (the sqlite3 module's statement LRU)
+SQL_STATEMENT_CACHE = 256
+# Read-only connections shared by all threads; a checkout waits when all are busy
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "4"))
+
+
+class ReadOnlyPool:
+    """
+    Bounded pool of read-only connections to a SQLite file, shared by every
+    thread. Streamlit runs each rerun and LangGraph each tool call on a fresh
+    thread, so connections are checked out per cursor() and returned afterwards
+    instead of being tied to a thread; callers stop paying for connect + PRAGMA
+    setup on every call. At most `size` connections are ever open.
+    Connections are opened through a `mode=ro` URI with PRAGMA query_only, so a
+    query can never write even if it slips past the tool's SELECT check.
+    A connection is re-opened if the database file was replaced (e.g. deleted
+    and re-created). data_version() tells result caches when the database has changed.
+    """
+
+    def __init__(self, path: str = DB_PATH, size: int = SQL_POOL_SIZE):
+        self.path = path
+        self.size = max(1, size)
+        # Idle (connection, file id) pairs
+        self._idle: "queue.LifoQueue[Tuple[sqlite3.Connection, Tuple]]" = queue.LifoQueue()
+        self._open_count = 0
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "closed": 0, "reopened": 0, "checkouts": 0, "waits": 0, "connect_ms": 0.0}
+        # Probe connection for data_version(), shared by all threads under _probe_lock
+        self._probe_lock = threading.Lock()
+        self._probe: Optional[sqlite3.Connection] = None
+        self._probe_file_id = None
+        self._probe_opens = 0
+
+    def _file_id(self):
+        stat = os.stat(self.path)
+        return (stat.st_dev, stat.st_ino)
+
+    def _open(self) -> sqlite3.Connection:
+        started = time.perf_counter()
+        uri = f"file:{quote(os.path.abspath(self.path))}?mode=ro"
+        # Used by one thread at a time, but not always the thread that opened it
+        conn = sqlite3.connect(uri, uri=True, cached_statements=SQL_STATEMENT_CACHE, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA mmap_size = {SQL_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size = -{SQL_CACHE_KB}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        with self._lock:
+            self._stats["opened"] += 1
+            self._stats["connect_ms"] += (time.perf_counter() - started) * 1000
+        return conn
+
+    def _close(self, conn: sqlite3.Connection):
+        conn.close()
+        with self._lock:
+            self._stats["closed"] += 1
+
+    def _checkout(self) -> Tuple[sqlite3.Connection, Tuple]:
+        """An idle connection to the current file, a new one while under `size`, or the next one returned."""
+        file_id = self._file_id()  # raises if the database doesn't exist (yet)
+        with self._lock:
+            self._stats["checkouts"] += 1
+        while True:
+            try:
+                conn, conn_file_id = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._open_count < self.size
+                    if can_open:
+                        self._open_count += 1
+                    else:
+                        self._stats["waits"] += 1
+                if can_open:
+                    try:
+                        return self._open(), file_id
+                    except Exception:
+                        with self._lock:
+                            self._open_count -= 1
+                        raise
+                conn, conn_file_id = self._idle.get()
+            if conn_file_id == file_id:
+                return conn, file_id
+            # The database file was replaced: this connection still reads the old one
+            self._close(conn)
+            with self._lock:
+                self._open_count -= 1
+                self._stats["reopened"] += 1
+
+    def _checkin(self, conn: sqlite3.Connection, file_id: Tuple):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put((conn, file_id))
+
+    def data_version(self) -> Tuple:
+        """
+        Token that changes whenever the database is modified by any other
+        connection (PRAGMA data_version on a connection that never writes),
+        or when the file is replaced. Cache results under it.
+        """
+        file_id = self._file_id()
+        with self._probe_lock:
+            if self._probe is None or self._probe_file_id != file_id:
+                if self._probe is not None:
+                    self._close(self._probe)
+                self._probe = self._open()
+                self._probe_file_id = file_id
+                self._probe_opens += 1
+            version = self._probe.execute("PRAGMA data_version").fetchone()[0]
+        return (self._probe_opens, version)
+
+    @contextmanager
+    def cursor(self, row_factory=None):
+        """Cursor on a pooled connection; the cursor is closed and the connection returned afterwards."""
+        conn, file_id = self._checkout()
+        try:
+            cur = conn.cursor()
+            cur.row_factory = row_factory
+            try:
+                yield cur
+            finally:
+                cur.close()
+        finally:
+            self._checkin(conn, file_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["open"] = stats["opened"] - stats["closed"]
+        stats["avg_connect_ms"] = round(stats["connect_ms"] / stats["opened"], 2) if stats["opened"] else 0.0
+        stats["reuse_rate"] = 1 - stats["opened"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        stats["connect_ms"] = round(stats["connect_ms"], 2)
+        return stats
+
+
+# Shared by the SQL tools and the UI
+read_pool = ReadOnlyPool()
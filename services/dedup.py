@@ -0,0 +1,96 @@
+import os
+import re
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Constants
+# Store chunks whose text is identical (up to whitespace) once ("0" disables)
+INDEX_DEDUP = os.getenv("INDEX_DEDUP", "1") == "1"
+# Also merge near-duplicates by SimHash ("1" enables). Off by default: clauses that
+# say different things can be only 1-3 bits apart ("30 days" vs "14 days",
+# "cannot be returned" vs "can be returned")
+INDEX_DEDUP_NEAR = os.getenv("INDEX_DEDUP_NEAR", "0") == "1"
+# Max differing SimHash bits (of 64) for two chunks to count as near-duplicates.
+# Near-duplicates must also contain the same numbers and negations (guard_key)
+DEDUP_MAX_DISTANCE = int(os.getenv("INDEX_DEDUP_DISTANCE", "3"))
+# Chunks shorter than this (in words) are never merged; their fingerprints are too noisy
+DEDUP_MIN_WORDS = 20
+SHINGLE_SIZE = 3
+# LSH keys: 4 bands of 16 bits. Fingerprints at most 3 bits apart always agree on
+# at least one band (pigeonhole), so a band match is the candidate filter
+BAND_COUNT = 4
+BAND_BITS = 64 // BAND_COUNT
+
+_MASK = (1 << 64) - 1
+_GUARD_RE = re.compile(r"\d+(?:[.,]\d+)*|\b(?:not|no|never|cannot|nor|none|without)\b|n't", re.IGNORECASE)
+
+
+def text_hash(text: str) -> str:
+    """Hash of the whitespace-normalised text: equal hashes are exact duplicates."""
+    return hashlib.sha1(" ".join(text.split()).encode()).hexdigest()
+
+
+def guard_key(text: str) -> str:
+    """The numbers and negations of a chunk, in order. Near-duplicates must agree on them."""
+    return "|".join(match.lower() for match in _GUARD_RE.findall(text))
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash over word 3-shingles, None if the text is too short to fingerprint."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < DEDUP_MIN_WORDS:
+        return None
+    shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    digests = b"".join(hashlib.blake2b(s.encode(), digest_size=8).digest() for s in shingles)
+    # One row of 64 bits per shingle (most significant bit first); a bit is set
+    # in the fingerprint when it is set in more than half of the shingles
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(len(shingles), 64)
+    majority = bits.sum(axis=0) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+
+def bands(fingerprint: int) -> List[int]:
+    return [(fingerprint >> (i * BAND_BITS)) & ((1 << BAND_BITS) - 1) for i in range(BAND_COUNT)]
+
+
+def hamming(a: int, b: int) -> int:
+    return bin((a ^ b) & _MASK).count("1")
+
+
+def to_signed(fingerprint: int) -> int:
+    """SQLite integers are signed 64-bit."""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def to_unsigned(value: int) -> int:
+    return value & _MASK
+
+
+class DuplicateIndex:
+    """
+    Text hashes (and, with INDEX_DEDUP_NEAR, LSH over SimHash bands) of the
+    canonical chunks of one indexing run, so duplicates across files in the same
+    batch are caught before anything is written to the manifest.
+    """
+
+    def __init__(self):
+        self._exact: Dict[str, str] = {}
+        self._buckets: Dict[Tuple[int, int], List[Tuple[int, str, str]]] = {}
+
+    def find_exact(self, digest: str) -> Optional[str]:
+        return self._exact.get(digest)
+
+    def find_near(self, fingerprint: int, guard: str) -> Optional[str]:
+        for band, value in enumerate(bands(fingerprint)):
+            for other, other_guard, chunk_id in self._buckets.get((band, value), ()):
+                if other_guard == guard and hamming(fingerprint, other) <= DEDUP_MAX_DISTANCE:
+                    return chunk_id
+        return None
+
+    def add(self, chunk_id: str, digest: str, fingerprint: Optional[int] = None, guard: Optional[str] = None):
+        self._exact.setdefault(digest, chunk_id)
+        if fingerprint is not None:
+            for band, value in enumerate(bands(fingerprint)):
+                self._buckets.setdefault((band, value), []).append((fingerprint, guard, chunk_id))
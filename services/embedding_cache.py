@@ -0,0 +1,173 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+# Constants
+EMBEDDING_CACHE_PATH = "data/embedding_cache.sqlite"
+# Size cap for stored vectors; least recently used rows are evicted beyond it
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "256"))
+# Enforce the cap after this many new rows rather than on every write
+EVICTION_CHECK_EVERY = 512
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk, content-addressed store of chunk embeddings keyed by
+    (embedding signature, sha256 of the text). Shared by PolicyEngine and the
+    ingest script, so re-embedding identical text never hits the model again.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_mb: float = EMBEDDING_CACHE_MAX_MB):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes_since_check = 0
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        if not hashes:
+            return found
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *part]
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, h) for h in found]
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(hashes)) - len(found)
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(model, h, array("f", vector).tobytes(), now) for h, vector in items.items()]
+            )
+            self._conn.commit()
+            self._writes_since_check += len(items)
+            if self._writes_since_check >= EVICTION_CHECK_EVERY:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used rows until the stored vectors fit the size cap."""
+        self._writes_since_check = 0
+        total = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        row_size = self._conn.execute("SELECT COALESCE(AVG(LENGTH(vector)), 1) FROM embeddings").fetchone()[0]
+        n_rows = int(excess / row_size) + 1
+        cur = self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+            (n_rows,)
+        )
+        self._conn.commit()
+        self.evictions += cur.rowcount
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "size": entries,
+            "size_mb": round(size / (1024 * 1024), 1),
+            "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that consults the persistent cache before the model.
+    The underlying model is only built on the first cache miss, so a rebuild of
+    an unchanged corpus never even loads the weights.
+    """
+
+    def __init__(self, build_model: Callable[[], Embeddings], signature: str, cache: Optional[EmbeddingCache] = None):
+        self._build_model = build_model
+        self._model: Optional[Embeddings] = None
+        self._model_lock = threading.Lock()
+        self.signature = signature
+        self.cache = cache or EmbeddingCache()
+
+    @property
+    def model(self) -> Embeddings:
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._build_model()
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(t) for t in texts]
+        cached = self.cache.get_many(self.signature, hashes)
+        missing: Dict[str, str] = {}
+        for h, t in zip(hashes, texts):
+            if h not in cached:
+                missing.setdefault(h, t)
+        if missing:
+            fresh = self.model.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), fresh))
+            self.cache.put_many(self.signature, computed)
+            cached.update(computed)
+        return [cached[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries have their own in-memory LRU (see retriever_registry)
+        return self.model.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Several queries in one batched forward pass. Like embed_query this skips the
+        persistent cache, so ad-hoc queries never evict chunk vectors from it.
+        """
+        # MiniLM uses no query instruction, so document and query embeddings are identical
+        return self.model.embed_documents(texts)
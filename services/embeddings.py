@@ -0,0 +1,73 @@
+import os
+import importlib.util
+from typing import Dict, Optional
+
+from langchain_core.embeddings import Embeddings
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Constants
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# "torch" (full precision PyTorch), "onnx" (fp32 ONNX export) or "onnx-int8" (quantized ONNX)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# Intra-op CPU threads for the encoder, 0 keeps the library default
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# Quantized export shipped in the model repo; avx2 build runs on any modern x86 CPU
+EMBEDDING_ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def embedding_signature(backend: str = EMBEDDING_BACKEND) -> str:
+    """
+    Identifies the vector space an index was built in.
+    torch and fp32 ONNX produce the same vectors, so they share a signature;
+    int8 vectors drift slightly and must not be mixed with full-precision ones.
+    """
+    return f"{EMBEDDING_MODEL}:int8" if backend == "onnx-int8" else EMBEDDING_MODEL
+
+
+def _onnx_model_kwargs(file_name: Optional[str] = None) -> Dict:
+    model_kwargs: Dict = {"provider": "CPUExecutionProvider"}
+    if file_name:
+        model_kwargs["file_name"] = file_name
+    if EMBEDDING_THREADS:
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = EMBEDDING_THREADS
+        model_kwargs["session_options"] = session_options
+    return model_kwargs
+
+
+def build_embeddings(backend: str = EMBEDDING_BACKEND) -> Embeddings:
+    """Create the MiniLM encoder for the selected CPU backend."""
+    # Imported here: pulling in sentence-transformers/torch is the slowest part of startup
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (use one of {', '.join(BACKENDS)})")
+
+    model_kwargs: Dict = {"device": "cpu"}
+    if backend == "torch":
+        if EMBEDDING_THREADS:
+            import torch
+            torch.set_num_threads(EMBEDDING_THREADS)
+    else:
+        # sentence-transformers >= 3.2 loads ONNX exports through optimum + onnxruntime
+        if importlib.util.find_spec("optimum") is None or importlib.util.find_spec("onnxruntime") is None:
+            raise ImportError(
+                f"EMBEDDING_BACKEND={backend} needs ONNX Runtime: pip install \"optimum[onnxruntime]\""
+            )
+        model_kwargs["backend"] = "onnx"
+        model_kwargs["model_kwargs"] = _onnx_model_kwargs(
+            EMBEDDING_ONNX_INT8_FILE if backend == "onnx-int8" else None
+        )
+
+    print(f"Loading embeddings {EMBEDDING_MODEL} (backend={backend}, batch_size={EMBEDDING_BATCH_SIZE})")
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE}
+    )
@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from services.policy_engine import policy_engine
+
+# Constants
+JOBS_FILE = "data/index_jobs.json"
+# Documents indexed at the same time (parsing overlaps; embedding shares the one model)
+INDEX_JOB_WORKERS = int(os.getenv("INDEX_JOB_WORKERS", "2"))
+# Finished jobs kept in the history file
+MAX_FINISHED_JOBS = 50
+# Progress is written to disk at most this often per job (seconds)
+PROGRESS_SAVE_INTERVAL = 1.0
+
+KINDS = ("index", "delete", "index_batch")
+ACTIVE = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class IndexJobQueue:
+    """
+    In-process queue that runs index/delete jobs on a small thread pool so the
+    Streamlit script never blocks on ingestion. Job state is persisted to
+    JOBS_FILE (queued | running | done | failed | cancelled) for the UI to poll.
+    Jobs that share a doc_id run one after another in submission order, and
+    duplicate requests coalesce into the job that is already waiting.
+    "index_batch" jobs index many files in one PolicyEngine.index_files run
+    (one parallel parse and one batched embed pass) and hold all their doc_ids.
+    """
+
+    def __init__(self, path: str = JOBS_FILE, workers: int = INDEX_JOB_WORKERS):
+        self.path = path
+        self.workers = workers
+        self._lock = threading.RLock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._jobs: Dict[str, Dict] = self._load()
+        # Job ids not dispatched yet, in submission order
+        self._waiting: List[str] = []
+        self._running: Dict[str, str] = {}  # doc_id -> job id
+        self._cancel_requested = set()
+        self._last_saved: Dict[str, float] = {}
+
+    def _load(self) -> Dict[str, Dict]:
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    return {job["id"]: job for job in json.load(f)}
+            except Exception as e:
+                print(f"Could not read {self.path}: {e}")
+        return {}
+
+    def _save(self):
+        with self._lock:
+            finished = sorted((j for j in self._jobs.values() if j["status"] not in ACTIVE),
+                              key=lambda j: j["created_at"])
+            for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self._jobs[job["id"]]
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(list(self._jobs.values()), f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def resume(self) -> int:
+        """Re-queue jobs that were queued or running when the process last stopped."""
+        with self._lock:
+            interrupted = [j for j in self._jobs.values()
+                           if j["status"] in ACTIVE and j["id"] not in self._running.values()
+                           and j["id"] not in self._waiting]
+            for job in sorted(interrupted, key=lambda j: j["created_at"]):
+                job["status"] = "queued"
+                self._enqueue(job)
+        if interrupted:
+            print(f"Resumed {len(interrupted)} interrupted indexing job(s)")
+        return len(interrupted)
+
+    def submit(self, kind: str, filename: str, force: bool = False) -> str:
+        """
+        Queue an index or delete job and return its id. An identical job still
+        waiting for the same document is reused instead of queueing another;
+        a delete cancels pending index jobs for that document.
+        """
+        if kind not in ("index", "delete"):
+            raise ValueError(f"Unknown job kind '{kind}' (use one of index, delete; or submit_batch)")
+        doc_id = policy_engine._get_doc_id(filename)
+        with self._lock:
+            for job_id in self._pending(doc_id):
+                job = self._jobs[job_id]
+                if job["kind"] == kind and job["force"] == force:
+                    return job_id
+            if kind == "delete":
+                for job_id in self._waiting + [self._running.get(doc_id)]:
+                    if job_id and doc_id in _doc_ids(self._jobs[job_id]):
+                        self._drop_from(self._jobs[job_id], doc_id)
+
+            job = self._new_job(kind, filename, force, doc_id=doc_id,
+                                progress={"pages_done": 0, "total_pages": None, "chunks_embedded": 0})
+        return job["id"]
+
+    def submit_batch(self, filenames: List[str]) -> Optional[str]:
+        """
+        Queue one job that indexes `filenames` in a single batched index_files run.
+        Files that already have an index job waiting are left to that job.
+        Returns the job id, or None if every file was already queued.
+        """
+        with self._lock:
+            todo = {}
+            for filename in dict.fromkeys(filenames):
+                doc_id = policy_engine._get_doc_id(filename)
+                if not any(self._jobs[job_id]["kind"] != "delete" and not self._jobs[job_id]["force"]
+                           for job_id in self._pending(doc_id)):
+                    todo[doc_id] = filename
+            if not todo:
+                return None
+            job = self._new_job("index_batch", f"{len(todo)} file(s)", False,
+                                filenames=list(todo.values()), doc_ids=list(todo),
+                                progress={"files_done": 0, "total_files": len(todo), "chunks_embedded": 0})
+        return job["id"]
+
+    def _new_job(self, kind: str, filename: str, force: bool, progress: Dict, **fields) -> Dict:
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "kind": kind,
+            "filename": filename,
+            "doc_id": None,
+            "force": force,
+            "status": "queued",
+            "progress": progress,
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            **fields
+        }
+        self._jobs[job["id"]] = job
+        self._enqueue(job)
+        self._save()
+        return job
+
+    def _drop_from(self, job: Dict, doc_id: str):
+        """A delete is coming for doc_id: stop job (an index job) from indexing it if it hasn't started."""
+        if job["kind"] == "index":
+            self.cancel(job["id"])
+        elif job["kind"] == "index_batch" and job["status"] == "queued":
+            keep = [i for i, d in enumerate(job["doc_ids"]) if d != doc_id]
+            job["filenames"] = [job["filenames"][i] for i in keep]
+            job["doc_ids"] = [job["doc_ids"][i] for i in keep]
+            job["filename"] = f"{len(keep)} file(s)"
+            job["progress"]["total_files"] = len(keep)
+            if self._running.get(doc_id) == job["id"]:
+                # Dispatched but not started: the document is no longer part of it
+                del self._running[doc_id]
+            if not keep:
+                self.cancel(job["id"])
+
+    def _pending(self, doc_id: str) -> List[str]:
+        """Ids of jobs for doc_id that have not started yet, in order."""
+        pending = [job_id for job_id in self._waiting if doc_id in _doc_ids(self._jobs[job_id])]
+        running = self._running.get(doc_id)
+        if running and self._jobs[running]["status"] == "queued":
+            pending.insert(0, running)
+        return pending
+
+    def _enqueue(self, job: Dict):
+        self._waiting.append(job["id"])
+        self._dispatch_ready()
+
+    def _dispatch_ready(self):
+        """Start every waiting job whose documents are free and not claimed by an earlier waiting job."""
+        claimed = set(self._running)
+        for job_id in list(self._waiting):
+            job = self._jobs[job_id]
+            doc_ids = set(_doc_ids(job))
+            if not doc_ids & claimed:
+                self._waiting.remove(job_id)
+                self._dispatch(job)
+            claimed |= doc_ids
+
+    def _dispatch(self, job: Dict):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="index-job")
+        for doc_id in _doc_ids(job):
+            self._running[doc_id] = job["id"]
+        self._executor.submit(self._run, job["id"])
+
+    def _run(self, job_id: str):
+        with self._lock:
+            job = self._jobs[job_id]
+            if job["status"] == "cancelled":
+                self._finish(job)
+                return
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            self._save()
+
+        def _progress(pages_done, total_pages, embedded):
+            if job_id in self._cancel_requested:
+                raise JobCancelled()
+            job["progress"] = {"pages_done": pages_done, "total_pages": total_pages, "chunks_embedded": embedded}
+            self._save_progress(job_id)
+
+        def _file_done(filename, result):
+            job["result"]["files"][filename] = result
+            job["progress"]["files_done"] += 1
+            job["progress"]["chunks_embedded"] += result.get("added", 0)
+            self._save_progress(job_id)
+
+        try:
+            if job["kind"] == "delete":
+                result = policy_engine.delete_file(job["filename"])
+            elif job["kind"] == "index_batch":
+                job["result"] = {"status": "success", "files": {}}
+                policy_engine.index_files(job["filenames"], on_result=_file_done)
+                result = job["result"]
+                failed = {name: r.get("message") for name, r in result["files"].items() if r["status"] == "error"}
+                if failed:
+                    result.update({"status": "error", "message": "; ".join(f"{n}: {m}" for n, m in failed.items())})
+            else:
+                result = policy_engine.index_file(job["filename"], force=job["force"], progress=_progress)
+            status = "failed" if result.get("status") == "error" else "done"
+            job.update({"status": status, "result": result, "error": result.get("message") if status == "failed" else None})
+        except JobCancelled:
+            job["status"] = "cancelled"
+        except Exception as e:
+            print(f"Job {job_id} ({job['kind']} {job['filename']}) failed: {e}")
+            job.update({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+        with self._lock:
+            self._finish(job)
+
+    def _save_progress(self, job_id: str):
+        now = time.time()
+        if now - self._last_saved.get(job_id, 0) >= PROGRESS_SAVE_INTERVAL:
+            self._last_saved[job_id] = now
+            self._save()
+
+    def _finish(self, job: Dict):
+        """Record the end of a job and start the next one waiting for the same document."""
+        job["finished_at"] = time.time()
+        self._cancel_requested.discard(job["id"])
+        self._last_saved.pop(job["id"], None)
+        for doc_id in _doc_ids(job):
+            if self._running.get(doc_id) == job["id"]:
+                del self._running[doc_id]
+        self._dispatch_ready()
+        self._save()
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued job, or ask a running index job to stop at its next batch.
+        Chunks it already upserted are rolled back, so a cancelled new document
+        leaves nothing behind in search.
+        Running delete and batch jobs can't be cancelled.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] not in ACTIVE:
+                return False
+            if job["status"] == "queued":
+                job["status"] = "cancelled"
+                if job_id in self._waiting:
+                    self._waiting.remove(job_id)
+                    job["finished_at"] = time.time()
+                    self._dispatch_ready()
+                self._save()
+                return True
+            if job["kind"] != "index":
+                return False
+            self._cancel_requested.add(job_id)
+            return True
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self, active_only: bool = False) -> List[Dict]:
+        """Jobs newest first."""
+        with self._lock:
+            jobs = [dict(j) for j in self._jobs.values() if not active_only or j["status"] in ACTIVE]
+        return sorted(jobs, key=lambda j: j["created_at"], reverse=True)
+
+    def has_active(self) -> bool:
+        with self._lock:
+            return any(j["status"] in ACTIVE for j in self._jobs.values())
+
+
+def _doc_ids(job: Dict) -> List[str]:
+    """Documents a job touches (batch jobs hold several)."""
+    return job["doc_ids"] if "doc_ids" in job else [job["doc_id"]]
+
+
+# Singleton instance for simple import
+index_jobs = IndexJobQueue()
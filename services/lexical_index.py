@@ -0,0 +1,206 @@
+import os
+import re
+import json
+import math
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# Constants
+LEXICAL_INDEX_PATH = "data/lexical_index.sqlite"
+
+# BM25 parameters (standard Okapi defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "for", "from", "how", "i",
+    "if", "in", "is", "it", "me", "my", "of", "on", "or", "our", "the", "to", "what",
+    "when", "where", "which", "who", "will", "with", "you", "your"
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk_id TEXT PRIMARY KEY,
+    doc_id TEXT,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(doc_id);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings(chunk_id);
+"""
+
+
+def lexical_index_path(label: Optional[str] = None) -> str:
+    """Index file of an index generation (see retriever_registry); None is the original index."""
+    return f"data/lexical_index_{label}.sqlite" if label else LEXICAL_INDEX_PATH
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word/number tokens without stopwords. Numbers are kept so '30 days' matches."""
+    return [t for t in re.findall(r"\w+", text.lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    On-disk BM25 inverted index over policy chunks, kept next to the vector store.
+    Updated per doc_id so re-indexing one file never rebuilds the whole index.
+
+    SQLite (WAL) tables:
+        postings: (term, chunk_id) -> term frequency
+        chunks:   chunk_id -> doc_id, text, metadata (JSON), length
+
+    Every write is one transaction touching only the affected chunks, so the app,
+    the ingest CLI and the watcher can update the same index without overwriting
+    each other, and searches always see the latest committed state.
+    An index written by the old JSON format is imported once on first open.
+    """
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._existed = os.path.exists(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._connect()
+        self._migrate_json()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _migrate_json(self):
+        legacy_path = f"{os.path.splitext(self.path)[0]}.json"
+        if not os.path.exists(legacy_path):
+            return
+        try:
+            with open(legacy_path, 'r') as f:
+                chunks = json.load(f).get("chunks", {})
+        except Exception as e:
+            print(f"Warning: could not read {legacy_path}, not migrated: {e}")
+            return
+        self.add_documents(Document(page_content=c["text"], metadata=c["metadata"]) for c in chunks.values())
+        os.replace(legacy_path, f"{legacy_path}.migrated")
+        self._existed = True
+        print(f"Migrated {len(chunks)} chunk(s) from {legacy_path} to {self.path}")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def exists(self) -> bool:
+        """False for an index that was only just created (nothing was ever written to it)."""
+        return self._existed or len(self) > 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def _add_chunk(self, conn, chunk_id: str, doc: Document):
+        counts = Counter(tokenize(doc.page_content))
+        conn.execute(
+            "INSERT INTO chunks (chunk_id, doc_id, text, metadata, length) VALUES (?, ?, ?, ?, ?)",
+            (chunk_id, doc.metadata.get("doc_id"), doc.page_content, json.dumps(doc.metadata), sum(counts.values()))
+        )
+        conn.executemany("INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                         [(term, chunk_id, tf) for term, tf in counts.items()])
+
+    def _remove_chunks(self, conn, chunk_ids: List[str]):
+        for start in range(0, len(chunk_ids), 500):
+            part = chunk_ids[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", part)
+            conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})", part)
+
+    def _doc_chunk_ids(self, conn, doc_id: str) -> List[str]:
+        return [row[0] for row in conn.execute("SELECT chunk_id FROM chunks WHERE doc_id = ?", (doc_id,))]
+
+    def add_documents(self, docs: Iterable[Document]):
+        """Add (or overwrite) chunks keyed by their chunk_id metadata."""
+        docs = [doc for doc in docs if doc.metadata.get("chunk_id")]
+        if not docs:
+            return
+        with self._transaction() as conn:
+            self._remove_chunks(conn, [doc.metadata["chunk_id"] for doc in docs])
+            for doc in docs:
+                self._add_chunk(conn, doc.metadata["chunk_id"], doc)
+
+    def remove_chunks(self, chunk_ids: Iterable[str]):
+        """Drop individual chunks (used by incremental re-indexing)."""
+        chunk_ids = list(chunk_ids)
+        if not chunk_ids:
+            return
+        with self._transaction() as conn:
+            self._remove_chunks(conn, chunk_ids)
+
+    def remove_document(self, doc_id: str):
+        """Drop every chunk belonging to doc_id."""
+        with self._transaction() as conn:
+            self._remove_chunks(conn, self._doc_chunk_ids(conn, doc_id))
+
+    def drop(self):
+        """Delete the index file (used when a retired index generation is garbage-collected); the object is unusable afterwards."""
+        with self._lock:
+            self._conn.close()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        """BM25 top-k over the indexed chunks."""
+        with self._lock:
+            # One read transaction, so a concurrent writer can't skew the statistics mid-query
+            self._conn.execute("BEGIN")
+            try:
+                n_docs, total_length = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks").fetchone()
+                if not n_docs:
+                    return []
+                avg_len = total_length / n_docs
+                scores: Dict[str, float] = {}
+                for term in set(tokenize(query)):
+                    posting = self._conn.execute(
+                        "SELECT p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c ON c.chunk_id = p.chunk_id "
+                        "WHERE p.term = ?", (term,)
+                    ).fetchall()
+                    if not posting:
+                        continue
+                    idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                    for chunk_id, tf, length in posting:
+                        norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len)
+                        scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+
+                top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+                if not top:
+                    return []
+                rows = {
+                    row[0]: row[1:] for row in self._conn.execute(
+                        f"SELECT chunk_id, text, metadata FROM chunks WHERE chunk_id IN ({','.join('?' * len(top))})",
+                        [cid for cid, _ in top]
+                    )
+                }
+            finally:
+                self._conn.execute("COMMIT")
+            return [
+                (Document(page_content=rows[cid][0], metadata=json.loads(rows[cid][1])), score)
+                for cid, score in top
+            ]
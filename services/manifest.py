@@ -0,0 +1,323 @@
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+from services.dedup import BAND_COUNT, DEDUP_MAX_DISTANCE, bands, hamming, to_signed, to_unsigned
+
+# Constants
+MANIFEST_PATH = "data/manifest.sqlite"
+# Pre-manifest state files, imported once on first open
+LEGACY_STATE_FILE = "data/indexed_state.json"
+LEGACY_ACTIVE_INDEX_FILE = "data/active_index.json"
+
+DOCUMENT_FIELDS = ("doc_id", "filename", "chunk_count", "page_count", "indexed_at", "embedding", "chunker", "file_hash")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    page_count INTEGER,
+    indexed_at TEXT,
+    embedding TEXT,
+    chunker TEXT,
+    file_hash TEXT,
+    chunks_recorded INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    doc_id TEXT NOT NULL REFERENCES documents(doc_id) ON DELETE CASCADE,
+    chunk_hash TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    PRIMARY KEY (doc_id, chunk_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_id ON chunks(chunk_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class Manifest:
+    """
+    Document/chunk manifest of the policy index in SQLite (WAL).
+
+    documents  one row per indexed file (hashes, counts, embedding signature)
+    chunks     (doc_id, chunk_hash) -> vector id; content lookups across
+               documents go through text_hash. Duplicates point at the chunk whose vector they share
+               (canonical_id) and keep their own text, so they can be re-embedded
+               if that chunk goes away; text_hash finds exact duplicates, and
+               canonical chunks carry SimHash LSH bands b0..b3 (INDEX_DEDUP_NEAR)
+    meta       small key/value settings, e.g. the active index generation
+
+    Every write is a single transaction touching only the affected document's
+    rows, so concurrent sessions can't clobber each other and a crash never
+    leaves a half-written manifest. Entries are plain dicts shaped like the old
+    indexed_state.json records ("chunks" is present only if hashes were recorded).
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._add_columns()
+        self._migrate_legacy_files()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _add_columns(self):
+        # Manifests created before near-duplicate detection / chunker tracking lack these columns
+        added = {
+            "documents": ["chunker TEXT"],
+            "chunks": ["page INTEGER", "simhash INTEGER", "canonical_id TEXT", "text_hash TEXT", "guard TEXT", "text TEXT"]
+                      + [f"b{i} INTEGER" for i in range(BAND_COUNT)]
+        }
+        chunk_columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        for table, columns in added.items():
+            existing = {row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            for column in columns:
+                if column.split()[0] not in existing:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+        if "canonical_id" in chunk_columns and "text_hash" not in chunk_columns:
+            # Duplicates merged by the old SimHash default may cite another policy's wording:
+            # clear their documents' file hash so the next sync re-diffs (and re-dedups) them
+            self._conn.execute(
+                "UPDATE documents SET file_hash = NULL WHERE doc_id IN "
+                "(SELECT doc_id FROM chunks WHERE canonical_id IS NOT NULL AND canonical_id != chunk_id)"
+            )
+        # Per-document hash lookups use the primary key, cross-document ones text_hash
+        self._conn.execute("DROP INDEX IF EXISTS idx_chunks_hash")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_canonical ON chunks(canonical_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_text_hash ON chunks(text_hash) WHERE text_hash IS NOT NULL")
+        for i in range(BAND_COUNT):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_chunks_b{i} ON chunks(b{i}) WHERE b{i} IS NOT NULL")
+
+    def _migrate_legacy_files(self):
+        if os.path.exists(LEGACY_STATE_FILE):
+            try:
+                with open(LEGACY_STATE_FILE, 'r') as f:
+                    state = json.load(f)
+            except ValueError as e:
+                # Keep the file for inspection; the next sync re-indexes whatever is on disk
+                print(f"Warning: {LEGACY_STATE_FILE} is corrupt ({e}); not migrated")
+                os.replace(LEGACY_STATE_FILE, f"{LEGACY_STATE_FILE}.corrupt")
+                state = None
+        else:
+            state = None
+        if state is not None:
+            with self._transaction() as conn:
+                for entry in state.values():
+                    self._write(conn, entry)
+            os.replace(LEGACY_STATE_FILE, f"{LEGACY_STATE_FILE}.migrated")
+            print(f"Migrated {len(state)} document(s) from {LEGACY_STATE_FILE} to {self.path}")
+        if os.path.exists(LEGACY_ACTIVE_INDEX_FILE):
+            with open(LEGACY_ACTIVE_INDEX_FILE, 'r') as f:
+                pointers = json.load(f)
+            with self._transaction() as conn:
+                for backend, label in pointers.items():
+                    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                 (f"active_index:{backend}", label))
+            os.replace(LEGACY_ACTIVE_INDEX_FILE, f"{LEGACY_ACTIVE_INDEX_FILE}.migrated")
+
+    def _write(self, conn, entry: Dict):
+        chunks = entry.get("chunks")
+        conn.execute(
+            "INSERT INTO documents "
+            "(doc_id, filename, chunk_count, page_count, indexed_at, embedding, chunker, file_hash, chunks_recorded) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(doc_id) DO UPDATE SET filename = excluded.filename, chunk_count = excluded.chunk_count, "
+            "page_count = excluded.page_count, indexed_at = excluded.indexed_at, embedding = excluded.embedding, "
+            "chunker = excluded.chunker, file_hash = excluded.file_hash, chunks_recorded = excluded.chunks_recorded",
+            (entry["doc_id"], entry.get("filename"), entry.get("chunk_count", 0), entry.get("page_count"),
+             entry.get("indexed_at"), entry.get("embedding"), entry.get("chunker"), entry.get("file_hash"),
+             int(chunks is not None))
+        )
+        conn.execute("DELETE FROM chunks WHERE doc_id = ?", (entry["doc_id"],))
+        if chunks:
+            chunk_meta = entry.get("chunk_meta") or {}
+            rows = []
+            for chunk_hash, chunk_id in chunks.items():
+                meta = chunk_meta.get(chunk_id, {})
+                fingerprint = meta.get("simhash")
+                canonical_id = meta.get("canonical_id") or chunk_id
+                # Only canonical chunks are candidates for later near-duplicate lookups
+                lsh = bands(fingerprint) if fingerprint is not None and canonical_id == chunk_id else [None] * BAND_COUNT
+                # Duplicates keep their own text; a canonical chunk's text is in the vector store
+                text = meta.get("text") if canonical_id != chunk_id else None
+                rows.append((entry["doc_id"], chunk_hash, chunk_id, meta.get("page"),
+                             to_signed(fingerprint) if fingerprint is not None else None, canonical_id,
+                             meta.get("text_hash"), meta.get("guard"), text, *lsh))
+            conn.executemany(
+                f"INSERT INTO chunks (doc_id, chunk_hash, chunk_id, page, simhash, canonical_id, text_hash, guard, text, "
+                f"{', '.join(f'b{i}' for i in range(BAND_COUNT))}) VALUES ({', '.join('?' * (9 + BAND_COUNT))})",
+                rows
+            )
+
+    def _entry(self, row: sqlite3.Row) -> Dict:
+        # Same shape as the JSON records: optional fields are left out when unknown
+        return {field: row[field] for field in DOCUMENT_FIELDS if row[field] is not None}
+
+    # --- reads ---
+    def get(self, doc_id: str) -> Optional[Dict]:
+        """One document with its chunk_hash -> chunk_id map."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return None
+            entry = self._entry(row)
+            if row["chunks_recorded"]:
+                rows = self._conn.execute(
+                    "SELECT chunk_hash, chunk_id, page, simhash, canonical_id, text_hash, guard, text "
+                    "FROM chunks WHERE doc_id = ?", (doc_id,)
+                ).fetchall()
+                entry["chunks"] = {r["chunk_hash"]: r["chunk_id"] for r in rows}
+                entry["chunk_meta"] = {
+                    r["chunk_id"]: {
+                        "page": r["page"],
+                        "simhash": to_unsigned(r["simhash"]) if r["simhash"] is not None else None,
+                        "canonical_id": r["canonical_id"] or r["chunk_id"],
+                        "text_hash": r["text_hash"],
+                        "guard": r["guard"],
+                        "text": r["text"]
+                    }
+                    for r in rows
+                }
+        return entry
+
+    def list_documents(self) -> List[Dict]:
+        """Document rows without their chunk maps (cheap enough for the sidebar)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM documents ORDER BY filename").fetchall()
+        return [self._entry(row) for row in rows]
+
+    def find_exact_duplicate(self, digest: str, exclude_doc_id: Optional[str] = None) -> Optional[str]:
+        """Canonical chunk of another document with the same normalised text (see dedup.text_hash)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE text_hash = ? AND canonical_id = chunk_id AND doc_id != ? LIMIT 1",
+                (digest, exclude_doc_id or "")
+            ).fetchone()
+        return row["chunk_id"] if row else None
+
+    def find_near_duplicate(self, fingerprint: int, guard: str, exclude_doc_id: Optional[str] = None) -> Optional[str]:
+        """
+        Canonical chunk within DEDUP_MAX_DISTANCE bits of the fingerprint (LSH band
+        lookup) that also has the same numbers and negations (dedup.guard_key).
+        """
+        where = " OR ".join(f"b{i} = ?" for i in range(BAND_COUNT))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT chunk_id, simhash FROM chunks WHERE ({where}) AND guard = ? AND doc_id != ?",
+                [*bands(fingerprint), guard, exclude_doc_id or ""]
+            ).fetchall()
+        for row in rows:
+            if hamming(fingerprint, to_unsigned(row["simhash"])) <= DEDUP_MAX_DISTANCE:
+                return row["chunk_id"]
+        return None
+
+    def duplicates_of(self, canonical_ids: Iterable[str], exclude_doc_id: Optional[str] = None) -> Dict[str, List[Dict]]:
+        """Chunks that share the vector of each canonical chunk: id -> [{doc_id, chunk_id, page, filename, text}]."""
+        found: Dict[str, List[Dict]] = {}
+        ids = list(canonical_ids)
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT c.canonical_id, c.doc_id, c.chunk_id, c.page, c.text, d.filename "
+                    "FROM chunks c JOIN documents d ON d.doc_id = c.doc_id "
+                    f"WHERE c.canonical_id IN ({','.join('?' * len(part))}) AND c.chunk_id != c.canonical_id "
+                    "AND c.doc_id != ? ORDER BY d.filename, c.page",
+                    [*part, exclude_doc_id or ""]
+                ).fetchall()
+                for row in rows:
+                    found.setdefault(row["canonical_id"], []).append({
+                        "doc_id": row["doc_id"], "chunk_id": row["chunk_id"],
+                        "page": row["page"], "filename": row["filename"], "text": row["text"]
+                    })
+        return found
+
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    # --- writes (one transaction each) ---
+    def put(self, entry: Dict):
+        """Insert or replace one document and its chunk map."""
+        with self._transaction() as conn:
+            self._write(conn, entry)
+
+    def delete(self, doc_id: str) -> bool:
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,)).rowcount > 0
+
+    def reassign_canonical(self, heirs: Dict[str, str]):
+        """
+        Make heirs[old] the canonical chunk for everything that pointed at old
+        (its vector is about to be deleted); the heir's own text is now in the
+        vector store, and it takes over the LSH bands.
+        """
+        with self._transaction() as conn:
+            for old, heir in heirs.items():
+                conn.execute("UPDATE chunks SET canonical_id = ? WHERE canonical_id = ?", (heir, old))
+                conn.execute("UPDATE chunks SET text = NULL WHERE chunk_id = ?", (heir,))
+                row = conn.execute("SELECT simhash FROM chunks WHERE chunk_id = ?", (heir,)).fetchone()
+                if row and row["simhash"] is not None:
+                    conn.execute(
+                        f"UPDATE chunks SET {', '.join(f'b{i} = ?' for i in range(BAND_COUNT))} WHERE chunk_id = ?",
+                        (*bands(to_unsigned(row["simhash"])), heir)
+                    )
+
+    def set_meta(self, key: str, value: str):
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def increment_meta(self, key: str) -> int:
+        """Atomically add 1 to an integer meta value (missing counts as 0); returns the new value."""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, '1') "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1", (key,)
+            )
+            return int(conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()["value"])
+
+    def replace_all(self, entries: Iterable[Dict], meta: Optional[Dict[str, str]] = None):
+        """Swap the whole manifest (and optionally meta keys) in one transaction."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM documents")
+            for entry in entries:
+                self._write(conn, entry)
+            for key, value in (meta or {}).items():
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+_lock = threading.Lock()
+_manifest: Optional[Manifest] = None
+
+
+def get_manifest() -> Manifest:
+    """Process-wide manifest, opened (and migrated) on first use."""
+    global _manifest
+    if _manifest is None:
+        with _lock:
+            if _manifest is None:
+                _manifest = Manifest()
+    return _manifest
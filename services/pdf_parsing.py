@@ -0,0 +1,104 @@
+import queue
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from services.chunking import get_splitter
+
+# Batches buffered between the parse and embed stages; the parser blocks when full
+STREAM_QUEUE_DEPTH = 2
+
+_DONE = object()
+
+
+def count_pages(file_path: str) -> Optional[int]:
+    """Page count from the PDF trailer without extracting any text (None if unreadable)."""
+    try:
+        from pypdf import PdfReader
+        return len(PdfReader(file_path).pages)
+    except Exception:
+        return None
+
+
+def iter_page_chunks(file_path: str) -> Iterator[List[Document]]:
+    """
+    Lazily load a PDF one page at a time and yield that page's chunks
+    (1-based page numbers). Only one page of text is held in memory.
+    """
+    from langchain_community.document_loaders import PyPDFLoader
+
+    text_splitter = get_splitter()
+    for page in PyPDFLoader(file_path).lazy_load():
+        chunks = text_splitter.split_documents([page])
+        for chunk in chunks:
+            chunk.metadata["page"] = chunk.metadata.get("page", 0) + 1 # 1-based
+        yield chunks
+
+
+def parse_and_chunk(file_path: str) -> Tuple[int, List[Document]]:
+    """
+    Load a PDF and split it into chunks with 1-based page numbers.
+    Kept free of model/store state so it can run in a worker process.
+    Returns (page_count, chunks).
+    """
+    pages = 0
+    chunks: List[Document] = []
+    for page_chunks in iter_page_chunks(file_path):
+        pages += 1
+        chunks.extend(page_chunks)
+    return pages, chunks
+
+
+def stream_chunk_batches(file_path: str, batch_size: int,
+                         queue_depth: int = STREAM_QUEUE_DEPTH) -> Iterator[Tuple[int, List[Document]]]:
+    """
+    Parse/split in a producer thread and yield (pages_done, chunk_batch) to the caller,
+    which embeds and upserts. The bounded queue is the backpressure: at most
+    `queue_depth` batches wait for the embedder, so memory stays flat however large
+    the PDF is. The final item is (total_pages, []). Producer errors are
+    re-raised in the caller.
+    """
+    batches: "queue.Queue" = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        # Give up if the consumer went away (error or cancellation)
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            pages = 0
+            pending: List[Document] = []
+            for page_chunks in iter_page_chunks(file_path):
+                pages += 1
+                pending.extend(page_chunks)
+                while len(pending) >= batch_size:
+                    if not _put((pages, pending[:batch_size])):
+                        return
+                    pending = pending[batch_size:]
+            if pending and not _put((pages, pending)):
+                return
+            _put((pages, _DONE))
+        except Exception as e:
+            _put((0, e))
+
+    producer = threading.Thread(target=_produce, name="pdf-parse", daemon=True)
+    producer.start()
+    try:
+        while True:
+            pages, item = batches.get()
+            if item is _DONE:
+                yield pages, []
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield pages, item
+    finally:
+        stop.set()
@@ -1,21 +1,28 @@
 import os
-import json
 import time
 from datetime import datetime
 import hashlib
 import shutil
-from typing import List, Dict, Optional
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, Dict, Optional
 
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
 from langchain_core.documents import Document
 
+from services import retriever_registry
+from services.manifest import get_manifest
+from services.dedup import INDEX_DEDUP, INDEX_DEDUP_NEAR, DuplicateIndex, guard_key, simhash, text_hash
+from services.embeddings import embedding_signature, EMBEDDING_MODEL
+from services.chunking import chunker_signature
+from services.pdf_parsing import parse_and_chunk, stream_chunk_batches, count_pages
+
 # Constants
 POLICIES_DIR = "data/policies"
-CHROMA_PATH = "data/chroma_db"
-STATE_FILE = "data/indexed_state.json"
+# Parser processes used for bulk rebuilds, and chunks per embed/upsert call
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", str(os.cpu_count() or 1)))
+UPSERT_BATCH_SIZE = int(os.getenv("INDEX_UPSERT_BATCH_SIZE", "256"))
+# Chunks per embed/upsert batch when streaming a single file
+STREAM_BATCH_SIZE = int(os.getenv("INDEX_STREAM_BATCH_SIZE", "64"))
 
 # Ensure directories exist
 os.makedirs(POLICIES_DIR, exist_ok=True)
@@ -23,43 +30,79 @@ os.makedirs("data", exist_ok=True)
 
 class PolicyEngine:
     def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        self.vector_store = Chroma(
-            persist_directory=CHROMA_PATH,
-            embedding_function=self.embeddings
-        )
-        self.state = self._load_state()
-
-    def _load_state(self) -> Dict:
-        if os.path.exists(STATE_FILE):
-            try:
-                with open(STATE_FILE, 'r') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
+        # Cheap on purpose: the embedding model, vector store and manifest are opened
+        # lazily (and warmed in the background by services/warmup.py)
+        self.last_rebuild_stats: Optional[Dict] = None
+
+    @property
+    def embeddings(self):
+        return retriever_registry.get_embeddings()
+
+    @property
+    def vector_store(self):
+        """Configured backend (see services/vector_backends.py)."""
+        return retriever_registry.get_vector_store()
 
-    def _save_state(self):
-        with open(STATE_FILE, 'w') as f:
-            json.dump(self.state, f, indent=2)
+    @property
+    def lexical_index(self):
+        return retriever_registry.get_lexical_index()
+
+    @property
+    def manifest(self):
+        """Per-document/chunk index state (see services/manifest.py)."""
+        return get_manifest()
 
     def _get_doc_id(self, filename: str) -> str:
         """Generate a consistent ID based on filename."""
         return hashlib.md5(filename.encode()).hexdigest()
 
+    def ensure_embedding_compatibility(self) -> bool:
+        """
+        Vectors from a different embedding signature (e.g. switching to onnx-int8)
+        can't be compared with the current encoder, so re-embed everything.
+        Docs indexed before signatures were recorded were built with full-precision MiniLM.
+        Run by the startup warm-up rather than __init__ so importing this module stays cheap.
+        Returns True if a re-embed was triggered.
+        """
+        current = embedding_signature()
+        stale = [d for d in self.get_indexed_files() if d.get("embedding", EMBEDDING_MODEL) != current]
+        if not stale:
+            return False
+        print(f"{len(stale)} document(s) were embedded with a different model/backend; re-embedding with {current}...")
+        self.reset_all(force=True)
+        return True
+
     def get_indexed_files(self) -> List[Dict]:
         """Return list of indexed files with metadata."""
-        return list(self.state.values())
+        return self.manifest.list_documents()
+
+    def _file_hash(self, file_path: str) -> str:
+        """Fingerprint the file bytes (streamed, so large PDFs aren't read into memory at once)."""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
 
-    def index_file(self, filename: str, file_path: Optional[str] = None) -> Dict:
+    def _chunk_hash(self, chunk: Document, seen: Dict[str, int]) -> str:
         """
-        Index a single PDF file.
-        1. Load PDF
-        2. Chunk
-        3. Delete old chunks for this doc_id
-        4. Insert new chunks
-        5. Update state
+        Content hash of a chunk. The page is part of the key because it is part of the citation;
+        repeated identical chunks within a file get an occurrence suffix (tracked in `seen`)
+        so they stay distinct.
         """
+        base = hashlib.sha1(f"{chunk.metadata.get('page')}\x00{chunk.page_content}".encode()).hexdigest()
+        seen[base] = seen.get(base, 0) + 1
+        return base if seen[base] == 1 else f"{base}#{seen[base]}"
+
+    def _chunk_hashes(self, chunks: List[Document]) -> List[str]:
+        seen: Dict[str, int] = {}
+        return [self._chunk_hash(chunk, seen) for chunk in chunks]
+
+    def _chunk_id(self, doc_id: str, chunk_hash: str) -> str:
+        return f"{doc_id}_{chunk_hash[:16]}{chunk_hash[40:].replace('#', '-')}"
+
+    def _check(self, filename: str, file_path: Optional[str], force: bool) -> Dict:
+        """Fingerprint the file and decide whether it needs (re-)indexing at all."""
         if not file_path:
             file_path = os.path.join(POLICIES_DIR, filename)
 
@@ -67,80 +110,567 @@ class PolicyEngine:
             raise FileNotFoundError(f"File {file_path} not found.")
 
         doc_id = self._get_doc_id(filename)
-        print(f"Indexing {filename} (Doc ID: {doc_id})...")
+        previous = self.manifest.get(doc_id) or {}
+        # Vectors from another encoder can't be reused, even for unchanged chunks
+        if previous and previous.get("embedding", EMBEDDING_MODEL) != embedding_signature():
+            force = True
+        file_hash = self._file_hash(file_path)
+        # Docs indexed before the chunker was recorded used the recursive splitter
+        rechunk = bool(previous) and previous.get("chunker", chunker_signature("recursive")) != chunker_signature()
+        return {
+            "filename": filename,
+            "file_path": file_path,
+            "doc_id": doc_id,
+            "previous": previous,
+            "file_hash": file_hash,
+            "force": force,
+            "unchanged": not (force or rechunk) and previous.get("file_hash") == file_hash
+        }
 
-        # 1. Load
-        loader = PyPDFLoader(file_path)
-        docs = loader.load()
-        if not docs:
-            return {"status": "error", "message": "No content found in PDF"}
+    def _unchanged_result(self, job: Dict) -> Dict:
+        previous = job["previous"]
+        print(f"Skipping {job['filename']}: unchanged since {previous.get('indexed_at')}")
+        return {
+            "status": "unchanged",
+            "chunks": previous.get("chunk_count", 0),
+            "pages": previous.get("page_count", 0),
+            "added": 0,
+            "removed": 0
+        }
+
+    def _dedup(self, chunk: Document, chunk_id: str, doc_id: str,
+               seen: Optional[DuplicateIndex], use_manifest: bool = True) -> Dict:
+        """
+        Manifest chunk_meta for a new chunk. When a chunk indexed earlier (or earlier
+        in this run) has the same text, or with INDEX_DEDUP_NEAR is a near-duplicate
+        with the same numbers and negations, canonical_id points at it and the chunk
+        is not embedded; its own text is kept in "text". Otherwise the chunk is its
+        own canonical. "near" (not persisted) marks a merge of non-identical text.
+        """
+        meta = {"page": chunk.metadata.get("page"), "simhash": None, "canonical_id": chunk_id,
+                "text_hash": None, "guard": None}
+        if not INDEX_DEDUP:
+            return meta
+        text = chunk.page_content
+        meta["text_hash"] = digest = text_hash(text)
+        canonical_id = seen.find_exact(digest) if seen is not None else None
+        if canonical_id is None and use_manifest:
+            canonical_id = self.manifest.find_exact_duplicate(digest, exclude_doc_id=doc_id)
+        near = False
+        if canonical_id is None and INDEX_DEDUP_NEAR:
+            meta["simhash"] = fingerprint = simhash(text)
+            if fingerprint is not None:
+                meta["guard"] = guard = guard_key(text)
+                canonical_id = seen.find_near(fingerprint, guard) if seen is not None else None
+                if canonical_id is None and use_manifest:
+                    canonical_id = self.manifest.find_near_duplicate(fingerprint, guard, exclude_doc_id=doc_id)
+                near = canonical_id is not None
+        if canonical_id:
+            meta.update({"canonical_id": canonical_id, "text": text, "near": near})
+        elif seen is not None:
+            seen.add(chunk_id, digest, meta["simhash"], meta["guard"])
+        return meta
 
-        # 2. Chunk
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
-        )
-        chunks = text_splitter.split_documents(docs)
+    def _keeps_chunk(self, chunk_id: str, meta: Optional[Dict]) -> bool:
+        """
+        Whether an unchanged chunk keeps its recorded state. Duplicates recorded
+        without a text hash were merged by the old near-duplicate default and are
+        re-checked (and embedded if they no longer match exactly).
+        """
+        return not (meta and meta.get("canonical_id") not in (None, chunk_id) and not meta.get("text_hash"))
+
+    def _promote_duplicates(self, chunk_ids: List[str], exclude_doc_id: Optional[str] = None) -> Dict[str, str]:
+        """
+        Call before deleting vectors: every canonical chunk among `chunk_ids` that
+        other chunks still share is re-added under the id, citation and own text
+        of one of them (the heir), which becomes the new canonical. For exact
+        duplicates the embedding comes from the embedding cache. Returns {old id: heir id}.
+        """
+        if not INDEX_DEDUP or not chunk_ids:
+            return {}
+        doomed = set(chunk_ids)
+        heirs: Dict[str, Dict] = {}
+        for canonical_id, copies in self.manifest.duplicates_of(doomed, exclude_doc_id=exclude_doc_id).items():
+            survivors = [copy for copy in copies if copy["chunk_id"] not in doomed]
+            if survivors:
+                heirs[canonical_id] = survivors[0]
+        if not heirs:
+            return {}
 
-        # 3. Enrich Metadata
+        promoted = []
+        for original in self.vector_store.get_by_ids(list(heirs)):
+            heir = heirs[original.metadata["chunk_id"]]
+            # Manifests written before duplicates kept their text fall back to the shared text
+            promoted.append(Document(page_content=heir.get("text") or original.page_content, metadata={
+                **original.metadata,
+                "doc_id": heir["doc_id"],
+                "doc_name": heir["filename"],
+                "source": os.path.join(POLICIES_DIR, heir["filename"]),
+                "page": heir["page"],
+                "chunk_id": heir["chunk_id"]
+            }))
+        if promoted:
+            self.vector_store.add_documents(promoted, ids=[d.metadata["chunk_id"] for d in promoted])
+            self.lexical_index.add_documents(promoted)
+        mapping = {old: heirs[old]["chunk_id"] for old in heirs}
+        self.manifest.reassign_canonical(mapping)
+        print(f"Promoted {len(promoted)} shared chunk(s) to a surviving duplicate")
+        return mapping
+
+    def _plan(self, job: Dict, page_count: int, chunks: List[Document],
+              seen: Optional[DuplicateIndex] = None, use_manifest: bool = True) -> Dict:
+        """
+        Diff freshly parsed chunks against the recorded chunk hashes. New chunks that
+        duplicate an indexed chunk (or one in `seen`) are recorded but not embedded.
+        """
+        doc_id, filename, previous, force = job["doc_id"], job["filename"], job["previous"], job["force"]
         timestamp = datetime.now().isoformat()
-        enriched_chunks = []
-        for i, chunk in enumerate(chunks):
+        chunk_hashes = self._chunk_hashes(chunks)
+
+        # Docs indexed before chunk hashes were recorded have unknown vector ids: rebuild them fully
+        legacy = bool(previous) and "chunks" not in previous
+        old_chunks: Dict[str, str] = {} if (legacy or force) else previous.get("chunks", {})
+        old_meta: Dict[str, Dict] = {} if (legacy or force) else previous.get("chunk_meta", {})
+
+        new_chunks = []
+        new_ids = []
+        duplicates: Dict[str, Document] = {}
+        chunk_map: Dict[str, str] = {}
+        chunk_meta: Dict[str, Dict] = {}
+        for chunk, chunk_hash in zip(chunks, chunk_hashes):
+            chunk_id = old_chunks.get(chunk_hash) or self._chunk_id(doc_id, chunk_hash)
+            chunk_map[chunk_hash] = chunk_id
+            if chunk_hash in old_chunks and self._keeps_chunk(chunk_id, old_meta.get(chunk_id)):
+                chunk_meta[chunk_id] = dict(old_meta.get(chunk_id) or {"page": chunk.metadata.get("page"), "canonical_id": chunk_id})
+                continue
             chunk.metadata.update({
                 "doc_id": doc_id,
                 "doc_name": filename,
-                "chunk_id": f"{doc_id}_{i}",
-                "indexed_at": timestamp,
-                "page": chunk.metadata.get("page", 0) + 1 # 1-based
+                "chunk_id": chunk_id,
+                "indexed_at": timestamp
             })
-            enriched_chunks.append(chunk)
+            chunk_meta[chunk_id] = self._dedup(chunk, chunk_id, doc_id, seen, use_manifest)
+            if chunk_meta[chunk_id]["canonical_id"] != chunk_id:
+                duplicates[chunk_id] = chunk
+                continue
+            new_chunks.append(chunk)
+            new_ids.append(chunk_id)
+        vanished_ids = [cid for h, cid in previous.get("chunks", {}).items() if h not in chunk_map or force]
+
+        return {
+            "filename": filename,
+            "doc_id": doc_id,
+            "legacy": legacy,
+            "new_chunks": new_chunks,
+            "new_ids": new_ids,
+            "duplicates": duplicates,
+            "vanished_ids": vanished_ids,
+            "total_chunks": len(chunks),
+            "state": {
+                "doc_id": doc_id,
+                "filename": filename,
+                "chunk_count": len(chunks),
+                "indexed_at": timestamp,
+                "page_count": page_count,
+                "embedding": embedding_signature(),
+                "chunker": chunker_signature(),
+                "file_hash": job["file_hash"],
+                "chunks": chunk_map,
+                "chunk_meta": chunk_meta
+            }
+        }
+
+    def _apply(self, plans: List[Dict], batch_size: int = UPSERT_BATCH_SIZE,
+               shadow: Optional[Dict] = None,
+               on_result: Optional[Callable[[str, Dict], None]] = None) -> Dict[str, Dict]:
+        """
+        Apply several diffs: per-file deletes, then ONE batched embed/upsert stage
+        across all files. A failing batch is retried file by file so one bad
+        document can't sink the others. Each file's BM25 rows and manifest entry are
+        committed as soon as its last chunk is upserted, then on_result(filename, result) is called.
+        `shadow` ({"store", "lexical", "state"}) redirects every write to an index
+        generation that is being rebuilt and is not live yet.
+        """
+        results: Dict[str, Dict] = {}
+        failed = set()
+        vector_store = shadow["store"] if shadow else self.vector_store
+        lexical_index = shadow["lexical"] if shadow else self.lexical_index
+
+        # Vectors still shared by other documents move to a surviving duplicate first
+        vanished = {cid for plan in plans for cid in plan["vanished_ids"]}
+        heirs: Dict[str, str] = {}
+        if not shadow:
+            try:
+                heirs = self._promote_duplicates(list(vanished))
+            except Exception as e:
+                print(f"Warning during duplicate promotion: {e}")
+        for plan in plans:
+            for chunk_id, meta in plan["state"]["chunk_meta"].items():
+                canonical_id = heirs.get(meta["canonical_id"], meta["canonical_id"])
+                chunk = plan["duplicates"].get(chunk_id)
+                if canonical_id in vanished and chunk is not None:
+                    # Its canonical is deleted in this same run and had no heir yet: store it itself
+                    canonical_id = chunk_id
+                    del plan["duplicates"][chunk_id]
+                    plan["new_chunks"].append(chunk)
+                    plan["new_ids"].append(chunk_id)
+                meta["canonical_id"] = canonical_id
+
+        # Deletes first (vanished chunks / legacy docs)
+        for plan in plans:
+            try:
+                if plan["legacy"]:
+                    print(f"Deleting legacy chunks for doc_id={plan['doc_id']}")
+                    vector_store.delete_document(plan["doc_id"])
+                elif plan["vanished_ids"]:
+                    vector_store.delete_ids(plan["vanished_ids"])
+            except Exception as e:
+                print(f"Warning during delete: {e}")
+
+        def _commit(plan):
+            """Keep the BM25 index and state in step with the vector store for one finished file."""
+            name = plan["filename"]
+            if name in failed:
+                if on_result:
+                    on_result(name, results[name])
+                return
+            if plan["legacy"]:
+                lexical_index.remove_document(plan["doc_id"])
+            lexical_index.remove_chunks(plan["vanished_ids"])
+            # Near-duplicates aren't embedded, but their own wording must stay findable by keyword
+            near = [chunk for chunk_id, chunk in plan["duplicates"].items()
+                    if plan["state"]["chunk_meta"][chunk_id].get("near")]
+            lexical_index.add_documents(plan["new_chunks"] + near)
+            if shadow:
+                shadow["state"][plan["doc_id"]] = plan["state"]
+            else:
+                # One transaction per document, written once its vectors are in
+                self.manifest.put(plan["state"])
+            print(f"{name}: {len(plan['new_chunks'])} chunks embedded, {len(plan['duplicates'])} duplicates, "
+                  f"{len(plan['vanished_ids'])} removed, "
+                  f"{plan['total_chunks'] - len(plan['new_chunks']) - len(plan['duplicates'])} unchanged")
+            results[name] = {
+                "status": "success",
+                "chunks": plan["total_chunks"],
+                "pages": plan["state"]["page_count"],
+                "added": len(plan["new_chunks"]),
+                "deduplicated": len(plan["duplicates"]),
+                "removed": len(plan["vanished_ids"])
+            }
+            if on_result:
+                on_result(name, results[name])
+
+        # Batched embedding + upsert; only new/modified chunks are embedded.
+        # Files are laid out back to back, so a file is done once the batches reach its end offset.
+        pending = [(chunk, chunk_id, plan["filename"])
+                   for plan in plans for chunk, chunk_id in zip(plan["new_chunks"], plan["new_ids"])]
+        ends, offset = [], 0
+        for plan in plans:
+            offset += len(plan["new_chunks"])
+            ends.append(offset)
+        committed = 0
+        for start in range(0, len(pending) + 1, batch_size):
+            batch = pending[start:start + batch_size]
+            if batch:
+                try:
+                    vector_store.add_documents([c for c, _, _ in batch], ids=[i for _, i, _ in batch])
+                except Exception as e:
+                    print(f"Batch upsert failed ({e}); retrying per file")
+                    for name in dict.fromkeys(f for _, _, f in batch):
+                        part = [(c, i) for c, i, f in batch if f == name]
+                        try:
+                            vector_store.add_documents([c for c, _ in part], ids=[i for _, i in part])
+                        except Exception as file_error:
+                            failed.add(name)
+                            results[name] = {"status": "error", "message": str(file_error)}
+            while committed < len(plans) and ends[committed] <= start + len(batch):
+                _commit(plans[committed])
+                committed += 1
+        if not shadow:
+            retriever_registry.invalidate()
+        return results
+
+    def index_file(self, filename: str, file_path: Optional[str] = None, force: bool = False,
+                   progress: Optional[Callable[[int, Optional[int], int], None]] = None,
+                   batch_size: int = STREAM_BATCH_SIZE) -> Dict:
+        """
+        Index a single PDF file incrementally, streaming load -> split -> embed -> upsert.
+        1. Fingerprint the file; skip entirely if unchanged (unless force)
+        2. Parse pages lazily in a producer thread (bounded queue = backpressure)
+        3. Hash each chunk and diff against the recorded chunk hashes
+        4. Embed/upsert new chunks in fixed-size batches as they arrive, then delete vanished ones
+        5. Update state (file hash + per-chunk hashes)
+        Memory stays flat regardless of PDF size, and chunks become searchable batch by batch.
+        progress(pages_done, total_pages, chunks_embedded) is called after every batch;
+        raising from it aborts the run: chunks upserted so far are rolled back (see
+        _discard_partial) and the manifest is not updated.
+        """
+        job = self._check(filename, file_path, force)
+        if job["unchanged"]:
+            return self._unchanged_result(job)
+
+        doc_id, previous, force = job["doc_id"], job["previous"], job["force"]
+        print(f"Indexing {filename} (Doc ID: {doc_id})...")
+        timestamp = datetime.now().isoformat()
 
-        # 4. Atomic-ish Update
-        # Delete existing chunks for this file
+        # Docs indexed before chunk hashes were recorded have unknown vector ids: rebuild them fully
+        legacy = bool(previous) and "chunks" not in previous
+        old_chunks: Dict[str, str] = {} if (legacy or force) else previous.get("chunks", {})
+        old_meta: Dict[str, Dict] = {} if (legacy or force) else previous.get("chunk_meta", {})
+
+        # New vectors may reuse old ids when rebuilding, so clear those before streaming
+        removed = 0
+        heirs: Dict[str, str] = {}
         try:
-            # Check if doc exists first to avoid error? Chroma delete handles empty fine usually.
-            # Using where clause
-            print(f"Deleting existing chunks for doc_id={doc_id}")
-            # Note: Chroma's delete might require ids or where clause. 
-            self.vector_store._collection.delete(where={"doc_id": doc_id})
+            if legacy:
+                print(f"Deleting legacy chunks for doc_id={doc_id}")
+                self.vector_store.delete_document(doc_id)
+                self.lexical_index.remove_document(doc_id)
+            elif force and previous.get("chunks"):
+                removed = len(previous["chunks"])
+                heirs = self._promote_duplicates(list(previous["chunks"].values()), exclude_doc_id=doc_id)
+                self.vector_store.delete_ids(list(previous["chunks"].values()))
+                self.lexical_index.remove_chunks(previous["chunks"].values())
         except Exception as e:
             print(f"Warning during delete: {e}")
 
-        # Add new chunks
-        if enriched_chunks:
-            self.vector_store.add_documents(enriched_chunks)
+        total_pages = count_pages(job["file_path"])
+        chunk_map: Dict[str, str] = {}
+        chunk_meta: Dict[str, Dict] = {}
+        seen: Dict[str, int] = {}
+        duplicates = DuplicateIndex()
+        near: List[Document] = []
+        pending: List[Document] = []
+        upserted: List[str] = []
+        pages = added = deduplicated = 0
+
+        def _flush():
+            nonlocal pending, added
+            if not pending:
+                return
+            ids = [c.metadata["chunk_id"] for c in pending]
+            upserted.extend(ids)
+            self.vector_store.add_documents(pending, ids=ids)
+            self.lexical_index.add_documents(pending)
+            added += len(pending)
+            pending = []
+            # Make this batch searchable right away
+            retriever_registry.invalidate()
+
+        try:
+            for pages, batch in stream_chunk_batches(job["file_path"], batch_size):
+                for chunk in batch:
+                    chunk_hash = self._chunk_hash(chunk, seen)
+                    chunk_id = old_chunks.get(chunk_hash) or self._chunk_id(doc_id, chunk_hash)
+                    if chunk_hash in old_chunks and self._keeps_chunk(chunk_id, old_meta.get(chunk_id)):
+                        chunk_map[chunk_hash] = chunk_id
+                        chunk_meta[chunk_id] = dict(old_meta.get(chunk_id) or {"page": chunk.metadata.get("page"), "canonical_id": chunk_id})
+                        continue
+                    chunk_map[chunk_hash] = chunk_id
+                    chunk.metadata.update({
+                        "doc_id": doc_id,
+                        "doc_name": filename,
+                        "chunk_id": chunk_id,
+                        "indexed_at": timestamp
+                    })
+                    chunk_meta[chunk_id] = self._dedup(chunk, chunk_id, doc_id, duplicates)
+                    if chunk_meta[chunk_id]["canonical_id"] != chunk_id:
+                        deduplicated += 1
+                        if chunk_meta[chunk_id]["near"]:
+                            near.append(chunk)
+                        continue
+                    pending.append(chunk)
+                if len(pending) >= batch_size:
+                    _flush()
+                if progress:
+                    progress(pages, total_pages, added)
+            _flush()
+            # Near-duplicates aren't embedded, but their own wording must stay findable by keyword
+            upserted.extend(c.metadata["chunk_id"] for c in near)
+            self.lexical_index.add_documents(near)
+            if progress:
+                # Last chance to cancel: nothing below can be rolled back
+                progress(pages, total_pages or pages, added)
+        except Exception:
+            self._discard_partial(doc_id, previous, upserted)
+            raise
+
+        if not chunk_map:
+            return {"status": "error", "message": "No content found in PDF"}
 
-        # 5. Update State
-        self.state[doc_id] = {
+        # Chunks that disappeared from the file
+        if not (legacy or force):
+            vanished_ids = [cid for h, cid in old_chunks.items() if h not in chunk_map]
+            removed = len(vanished_ids)
+            try:
+                heirs = self._promote_duplicates(vanished_ids)
+                self.vector_store.delete_ids(vanished_ids)
+            except Exception as e:
+                print(f"Warning during delete: {e}")
+            self.lexical_index.remove_chunks(vanished_ids)
+        retriever_registry.invalidate()
+        print(f"{filename}: {added} chunks embedded, {deduplicated} duplicates, {removed} removed, "
+              f"{len(chunk_map) - added - deduplicated} unchanged")
+        for meta in chunk_meta.values():
+            meta["canonical_id"] = heirs.get(meta["canonical_id"], meta["canonical_id"])
+
+        # 5. Update the manifest (one transaction, after every vector is in place)
+        self.manifest.put({
             "doc_id": doc_id,
             "filename": filename,
-            "chunk_count": len(enriched_chunks),
+            "chunk_count": len(chunk_map),
             "indexed_at": timestamp,
-            "page_count": len(docs)
-        }
-        self._save_state()
+            "page_count": pages,
+            "embedding": embedding_signature(),
+            "chunker": chunker_signature(),
+            "file_hash": job["file_hash"],
+            "chunks": chunk_map,
+            "chunk_meta": chunk_meta
+        })
         
         return {
             "status": "success",
-            "chunks": len(enriched_chunks),
-            "pages": len(docs)
+            "chunks": len(chunk_map),
+            "pages": pages,
+            "added": added,
+            "deduplicated": deduplicated,
+            "removed": removed
         }
 
+    def _discard_partial(self, doc_id: str, previous: Dict, upserted: List[str]):
+        """
+        Undo the upserts of an aborted index_file run. A document that was never
+        indexed is removed entirely (it isn't listed, so nothing else could remove it);
+        otherwise only chunks the manifest doesn't know are dropped.
+        """
+        try:
+            if not previous:
+                self.vector_store.delete_document(doc_id)
+                self.lexical_index.remove_document(doc_id)
+            else:
+                known = set((previous.get("chunks") or {}).values())
+                orphans = [chunk_id for chunk_id in upserted if chunk_id not in known]
+                self.vector_store.delete_ids(orphans)
+                self.lexical_index.remove_chunks(orphans)
+        except Exception as e:
+            print(f"Warning while discarding a partial index of doc_id={doc_id}: {e}")
+        retriever_registry.invalidate()
+
+    def index_files(self, filenames: List[str], workers: Optional[int] = None, force: bool = False,
+                    batch_size: int = UPSERT_BATCH_SIZE, shadow: Optional[Dict] = None,
+                    on_result: Optional[Callable[[str, Dict], None]] = None) -> Dict:
+        """
+        Index many PDFs: parse + chunk in a process pool, then embed/upsert everything
+        in one batched stage. Errors are isolated per file. With `shadow` every file
+        is indexed from scratch into that index generation (see _apply).
+        on_result(filename, result) is called as soon as each file's result is final
+        (for indexed files: once its manifest entry is committed).
+        Returns {"results": {filename: result}, "stats": throughput numbers}.
+        """
+        workers = workers or INDEX_WORKERS
+        started = time.perf_counter()
+        results: Dict[str, Dict] = {}
+
+        def _report(filename, result):
+            results[filename] = result
+            if on_result:
+                on_result(filename, result)
+
+        jobs = []
+        for filename in filenames:
+            try:
+                job = self._check(filename, None, force or bool(shadow))
+            except Exception as e:
+                _report(filename, {"status": "error", "message": str(e)})
+                continue
+            if shadow:
+                # Nothing to diff against or delete in a fresh generation
+                job["previous"] = {}
+            if job["unchanged"]:
+                _report(filename, self._unchanged_result(job))
+            else:
+                jobs.append(job)
+
+        # 1. Parse + chunk (CPU-bound, one PDF per worker process)
+        plans = []
+        pages = 0
+        parse_started = time.perf_counter()
+        # Catches duplicates between files of this run (none are in the manifest yet)
+        duplicates = DuplicateIndex()
+
+        def _collect(job, parsed):
+            nonlocal pages
+            page_count, chunks = parsed
+            if not chunks:
+                _report(job["filename"], {"status": "error", "message": "No content found in PDF"})
+                return
+            pages += page_count
+            plans.append(self._plan(job, page_count, chunks, duplicates, use_manifest=not shadow))
+
+        if workers > 1 and len(jobs) > 1:
+            # spawn, not fork: this runs inside the multi-threaded Streamlit process
+            # (warm-up rebuild, watcher) after torch is loaded, where fork can deadlock
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs)),
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = {pool.submit(parse_and_chunk, job["file_path"]): job for job in jobs}
+                for future in as_completed(futures):
+                    job = futures[future]
+                    try:
+                        _collect(job, future.result())
+                    except Exception as e:
+                        _report(job["filename"], {"status": "error", "message": str(e)})
+        else:
+            for job in jobs:
+                try:
+                    _collect(job, parse_and_chunk(job["file_path"]))
+                except Exception as e:
+                    _report(job["filename"], {"status": "error", "message": str(e)})
+        parse_seconds = time.perf_counter() - parse_started
+
+        # 2. Single batched embed/upsert stage
+        embed_started = time.perf_counter()
+        if plans:
+            results.update(self._apply(plans, batch_size=batch_size, shadow=shadow, on_result=on_result))
+        embed_seconds = time.perf_counter() - embed_started
+
+        total_seconds = time.perf_counter() - started
+        chunks = sum(p["total_chunks"] for p in plans)
+        embedded = sum(len(p["new_chunks"]) for p in plans)
+        deduplicated = sum(len(p["duplicates"]) for p in plans)
+        stats = {
+            "files": len(filenames),
+            "parsed_files": len(plans),
+            "failed_files": sum(1 for r in results.values() if r["status"] == "error"),
+            "workers": workers,
+            "pages": pages,
+            "chunks": chunks,
+            "embedded_chunks": embedded,
+            "deduplicated_chunks": deduplicated,
+            "parse_seconds": round(parse_seconds, 2),
+            "embed_seconds": round(embed_seconds, 2),
+            "total_seconds": round(total_seconds, 2),
+            "pages_per_sec": round(pages / parse_seconds, 1) if parse_seconds else 0.0,
+            "chunks_per_sec": round(embedded / embed_seconds, 1) if embed_seconds else 0.0
+        }
+        print(f"Indexed {stats['parsed_files']}/{stats['files']} files in {stats['total_seconds']}s: "
+              f"{stats['pages_per_sec']} pages/sec parsed, {stats['chunks_per_sec']} chunks/sec embedded")
+        return {"results": results, "stats": stats}
+
     def delete_file(self, filename: str) -> Dict:
         """Remove a file from index and disk."""
         doc_id = self._get_doc_id(filename)
         
-        # Delete from Vector DB
+        # Delete from Vector DB (shared chunks move to another document first)
         try:
-            self.vector_store._collection.delete(where={"doc_id": doc_id})
+            self._promote_duplicates(self._chunk_ids(doc_id), exclude_doc_id=doc_id)
+            self.vector_store.delete_document(doc_id)
         except Exception as e:
             print(f"Error deleting vectors: {e}")
+        self.lexical_index.remove_document(doc_id)
+        retriever_registry.invalidate()
 
-        # Remove from state
-        if doc_id in self.state:
-            del self.state[doc_id]
-            self._save_state()
+        # Remove from the manifest
+        self.manifest.delete(doc_id)
 
         # Remove file from disk
         file_path = os.path.join(POLICIES_DIR, filename)
@@ -149,31 +679,115 @@ class PolicyEngine:
 
         return {"status": "success", "message": f"Deleted {filename}"}
 
-    def reset_all(self):
-        """Wipe everything and re-index all files in policies dir."""
-        # 1. Clear State
-        self.state = {}
-        self._save_state()
+    def _chunk_ids(self, doc_id: str) -> List[str]:
+        return list(((self.manifest.get(doc_id) or {}).get("chunks") or {}).values())
 
-        # 2. Clear Chroma
-        # Safest way is to delete the directory and re-init, 
-        # but since we have a live instance, we try to delete all.
-        try:
-             ids = self.vector_store._collection.get()['ids']
-             if ids:
-                 self.vector_store._collection.delete(ids=ids)
-        except Exception as e:
-             print(f"Error clearing Chroma: {e}")
+    def list_policy_files(self) -> List[str]:
+        return sorted(f for f in os.listdir(POLICIES_DIR) if f.endswith('.pdf'))
+
+    def check_files(self, filenames: List[str]) -> Dict[str, str]:
+        """
+        What a sync would do with each file, without parsing or embedding anything:
+        "new", "modified", "unchanged" or "error: <reason>".
+        """
+        statuses = {}
+        for filename in filenames:
+            try:
+                job = self._check(filename, None, False)
+            except Exception as e:
+                statuses[filename] = f"error: {e}"
+                continue
+            if job["unchanged"]:
+                statuses[filename] = "unchanged"
+            else:
+                statuses[filename] = "modified" if job["previous"] else "new"
+        return statuses
+
+    def prune_missing(self, files: List[str], dry_run: bool = False) -> List[str]:
+        """Drop indexed documents whose file is no longer in `files`. Returns their filenames."""
+        present = set(files)
+        missing = [doc for doc in self.get_indexed_files() if doc.get("filename") not in present]
+        if dry_run or not missing:
+            return [doc.get("filename") for doc in missing]
+        for doc in missing:
+            try:
+                self._promote_duplicates(self._chunk_ids(doc["doc_id"]), exclude_doc_id=doc["doc_id"])
+                self.vector_store.delete_document(doc["doc_id"])
+            except Exception as e:
+                print(f"Error deleting vectors: {e}")
+            self.lexical_index.remove_document(doc["doc_id"])
+            self.manifest.delete(doc["doc_id"])
+        retriever_registry.invalidate()
+        return [doc.get("filename") for doc in missing]
 
-        # 3. Re-index all files
+    def rebuild(self, files: List[str], workers: Optional[int] = None) -> Dict:
+        """
+        Blue/green full rebuild: index every file into a fresh shadow generation
+        while queries keep hitting the live one, then atomically repoint readers
+        and drop the old generation. Answers stay available throughout.
+        Jobs or the watcher may change files while this runs; their writes go to
+        the old generation, so files added, modified or removed since the rebuild
+        started are re-synced into the new one right after the swap.
+        """
+        started = self._file_signatures()
+        label = retriever_registry.new_index_label()
+        store, lexical = retriever_registry.open_index(label)
+        print(f"Rebuilding {len(files)} file(s) into shadow index {label}...")
+        shadow = {"store": store, "lexical": lexical, "state": {}}
+        run = self.index_files(files, workers=workers, shadow=shadow)
+
+        # Manifest and active pointer switch in one transaction
+        previous = retriever_registry.activate(label, documents=list(shadow["state"].values()))
+        retriever_registry.retire(previous)
+
+        current = self._file_signatures()
+        self.prune_missing(list(current))
+        changed = [f for f, signature in current.items() if started.get(f) != signature]
+        if changed:
+            print(f"Re-syncing {len(changed)} file(s) changed during the rebuild...")
+            # force: their manifest rows may already describe vectors that went to the old generation
+            resync = self.index_files(changed, workers=workers, force=True)
+            run["results"].update(resync["results"])
+        return run
+
+    def _file_signatures(self) -> Dict[str, tuple]:
+        """filename -> (size, mtime_ns) of every policy file, to spot changes between two points in time."""
+        signatures = {}
+        for filename in self.list_policy_files():
+            try:
+                stat = os.stat(os.path.join(POLICIES_DIR, filename))
+            except FileNotFoundError:
+                continue
+            signatures[filename] = (stat.st_size, stat.st_mtime_ns)
+        return signatures
+
+    def reset_all(self, force: bool = False, workers: Optional[int] = None):
+        """
+        Re-sync the index with every file in the policies dir.
+        By default this is incremental: unchanged files are skipped and only changed
+        chunks are re-embedded. force=True re-embeds everything from scratch
+        (needed when the embedding model/backend changed) as a blue/green rebuild,
+        so the live index keeps serving queries until the new one is complete.
+        PDFs are parsed by `workers` processes (default INDEX_WORKERS); throughput
+        numbers of the last run are kept in self.last_rebuild_stats.
+        """
+        files = self.list_policy_files()
+
+        if force:
+            run = self.rebuild(files, workers=workers)
+        else:
+            self.prune_missing(files)
+
+            # Re-index changed files (parallel parse, one batched embed stage)
+            run = self.index_files(files, workers=workers)
+        self.last_rebuild_stats = run["stats"]
         results = []
-        files = [f for f in os.listdir(POLICIES_DIR) if f.endswith('.pdf')]
         for f in files:
-            try:
-                res = self.index_file(f)
+            res = run["results"].get(f, {"status": "error", "message": "not processed"})
+            if res["status"] == "error":
+                results.append(f"{f}: Error {res.get('message')}")
+            else:
                 results.append(f"{f}: {res['status']}")
-            except Exception as e:
-                results.append(f"{f}: Error {str(e)}")
         
         return results
 
@@ -0,0 +1,177 @@
+import os
+import time
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+from services.policy_engine import policy_engine, POLICIES_DIR
+
+# Constants
+# Seconds between directory scans
+WATCH_INTERVAL = float(os.getenv("POLICY_WATCH_INTERVAL", "2"))
+# Quiet period after the last change before a burst is ingested
+WATCH_DEBOUNCE = float(os.getenv("POLICY_WATCH_DEBOUNCE", "5"))
+# Start the watcher together with the Streamlit app ("1" to enable)
+POLICY_WATCH = os.getenv("POLICY_WATCH", "0") == "1"
+
+
+def snapshot(directory: str = POLICIES_DIR) -> Dict[str, Tuple[int, int]]:
+    """filename -> (size, mtime_ns) for every PDF in the directory."""
+    files = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+class PolicyWatcher:
+    """
+    Polls POLICIES_DIR and keeps the index in step with it. Changes are collected
+    until the folder has been quiet for `debounce` seconds (so half-copied files and
+    bulk drops settle), then applied as ONE incremental update: removed files are
+    dropped and all added/modified files go through PolicyEngine.index_files,
+    i.e. one parallel parse and one batched embed pass for the whole burst.
+    Modified files whose bytes did not change are skipped by the content hash.
+
+    Only POLICIES_DIR can be watched: the engine resolves (and deletes) files by
+    name in that folder. Inside the app, pass the app's IndexJobQueue as `jobs`:
+    a burst is then submitted as delete jobs plus ONE index_batch job (the same
+    batched index_files path), so a file is never indexed by an upload job and
+    the watcher at the same time.
+    """
+
+    def __init__(self, interval: float = WATCH_INTERVAL, debounce: float = WATCH_DEBOUNCE,
+                 engine=policy_engine, jobs=None):
+        self.directory = POLICIES_DIR
+        self.interval = interval
+        self.debounce = debounce
+        self.engine = engine
+        self.jobs = jobs
+        self._seen: Dict[str, Tuple[int, int]] = {}
+        self._changed: Set[str] = set()
+        self._removed: Set[str] = set()
+        self._last_event_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_run: Optional[Dict] = None
+
+    def sync(self) -> Dict:
+        """Reconcile with the folder as it is now (catches changes made while not watching)."""
+        self._seen = snapshot(self.directory)
+        indexed = {doc["filename"] for doc in self.engine.get_indexed_files()}
+        self._removed |= indexed - set(self._seen)
+        self._changed |= set(self._seen)  # unchanged files are skipped by hash
+        return self.flush()
+
+    def poll(self) -> bool:
+        """Scan once and queue any differences. Returns True if something changed."""
+        current = snapshot(self.directory)
+        changed = {name for name, sig in current.items() if self._seen.get(name) != sig}
+        removed = set(self._seen) - set(current)
+        self._seen = current
+        if not (changed or removed):
+            return False
+        self._changed = (self._changed | changed) - removed
+        self._removed = (self._removed | removed) - changed
+        self._last_event_at = time.monotonic()
+        print(f"Watcher: {len(changed)} added/modified, {len(removed)} removed (waiting for quiet period)")
+        return True
+
+    def due(self) -> bool:
+        return bool(self._changed or self._removed) and time.monotonic() - self._last_event_at >= self.debounce
+
+    def flush(self) -> Dict:
+        """Apply the queued changes as one batched incremental update."""
+        changed, removed = sorted(self._changed), sorted(self._removed)
+        self._changed, self._removed = set(), set()
+        started = time.perf_counter()
+        if self.jobs is not None:
+            return self._submit_jobs(changed, removed, started)
+        try:
+            for filename in removed:
+                # The file is already gone; this drops its vectors, BM25 entries and manifest row
+                self.engine.delete_file(filename)
+            run = self.engine.index_files(changed) if changed else {"results": {}, "stats": {}}
+        except Exception:
+            # Retry the whole burst on the next quiet period
+            self._changed |= set(changed)
+            self._removed |= set(removed)
+            self._last_event_at = time.monotonic()
+            raise
+        self.last_run = {
+            "indexed": sum(1 for r in run["results"].values() if r["status"] == "success"),
+            "unchanged": sum(1 for r in run["results"].values() if r["status"] == "unchanged"),
+            "failed": {name: r.get("message") for name, r in run["results"].items() if r["status"] == "error"},
+            "removed": len(removed),
+            "seconds": round(time.perf_counter() - started, 2),
+            "stats": run["stats"]
+        }
+        if changed or removed:
+            print(f"Watcher: indexed {self.last_run['indexed']}, unchanged {self.last_run['unchanged']}, "
+                  f"removed {len(removed)}, failed {len(self.last_run['failed'])} in {self.last_run['seconds']}s")
+        return self.last_run
+
+    def _submit_jobs(self, changed, removed, started: float) -> Dict:
+        # Queue only real changes, so the initial sync doesn't fill the job list with no-ops
+        statuses = self.engine.check_files(changed) if changed else {}
+        to_index = [name for name in changed if statuses.get(name) != "unchanged"]
+        for filename in removed:
+            self.jobs.submit("delete", filename)
+        if to_index:
+            self.jobs.submit_batch(to_index)
+        self.last_run = {
+            "queued": len(to_index),
+            "unchanged": len(changed) - len(to_index),
+            "removed": len(removed),
+            "seconds": round(time.perf_counter() - started, 2)
+        }
+        if to_index or removed:
+            print(f"Watcher: queued {len(to_index)} file(s) for batch indexing and {len(removed)} delete job(s)")
+        return self.last_run
+
+    def run(self, initial_sync: bool = True):
+        """Blocking watch loop; returns after stop()."""
+        print(f"Watching {self.directory} (every {self.interval}s, debounce {self.debounce}s)")
+        try:
+            if initial_sync:
+                self.sync()
+            else:
+                self._seen = snapshot(self.directory)
+        except Exception as e:
+            print(f"Watcher initial sync failed (will retry): {e}")
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+                if self.due():
+                    self.flush()
+            except Exception as e:
+                print(f"Watcher error: {e}")
+
+    def start(self, initial_sync: bool = True):
+        """Run the watch loop in a daemon thread (idempotent)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.run, args=(initial_sync,), name="policy-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+_lock = threading.Lock()
+_watcher: Optional[PolicyWatcher] = None
+
+
+def start_background_watcher() -> PolicyWatcher:
+    """Start the process-wide watcher thread, feeding the app's job queue (no-op after the first call)."""
+    global _watcher
+    from services.index_jobs import index_jobs
+    with _lock:
+        if _watcher is None:
+            _watcher = PolicyWatcher(jobs=index_jobs)
+            _watcher.start()
+    return _watcher
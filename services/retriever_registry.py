@@ -0,0 +1,354 @@
+import os
+import json
+import time
+import uuid
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from dotenv import load_dotenv
+
+from services.cache import LRUCache, normalize_query
+from services.lexical_index import LexicalIndex, lexical_index_path
+from services.vector_backends import create_backend, VECTOR_BACKEND
+from services.embeddings import build_embeddings, embedding_signature
+from services.embedding_cache import CachedEmbeddings
+from services.manifest import get_manifest
+
+load_dotenv()
+
+# Constants
+# Cache keys use the signature so int8 and full-precision vectors never mix
+EMBEDDING_SIGNATURE = embedding_signature()
+EMBED_CACHE_SIZE = int(os.getenv("RAG_EMBED_CACHE_SIZE", "512"))
+EMBED_CACHE_TTL = float(os.getenv("RAG_EMBED_CACHE_TTL", "3600"))  # seconds, 0 disables expiry
+RESULT_CACHE_SIZE = int(os.getenv("RAG_RESULT_CACHE_SIZE", "256"))
+# Candidates pulled from each ranking before fusion, and the RRF damping constant
+HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "10"))
+RRF_K = 60
+# Manifest meta key naming the index generation readers use (blue/green rebuilds)
+ACTIVE_INDEX_KEY = f"active_index:{VECTOR_BACKEND}"
+# Manifest meta counter bumped by every index write, in any process (app, ingest CLI,
+# watcher); cached retrieval results are only served for its current value
+GENERATION_KEY = "index_generation"
+# A retired generation is dropped this long after the swap so in-flight queries can finish
+RETIRE_GRACE_SECONDS = float(os.getenv("RAG_RETIRE_GRACE_SECONDS", "5"))
+
+# Process-wide shared handles. Streamlit re-runs scripts but keeps imported
+# modules alive, so these survive reruns and are shared by every session.
+_lock = threading.RLock()
+_embeddings: Optional[Embeddings] = None
+_vector_store = None
+_lexical_index: Optional[LexicalIndex] = None
+# Generation label the handles above were opened for (_UNOPENED before first use)
+_UNOPENED = object()
+_active_label = _UNOPENED
+
+# Query embeddings only depend on the model, so index changes never clear this cache
+query_embedding_cache = LRUCache(maxsize=EMBED_CACHE_SIZE, ttl=EMBED_CACHE_TTL or None)
+retrieval_cache = LRUCache(maxsize=RESULT_CACHE_SIZE)
+
+
+def get_embeddings() -> Embeddings:
+    """
+    Return the shared embedding model behind the persistent embedding cache.
+    The weights are only loaded on the first cache miss.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                _embeddings = CachedEmbeddings(build_embeddings, EMBEDDING_SIGNATURE)
+    return _embeddings
+
+
+def get_vector_store():
+    """
+    Return the shared vector store backend (VECTOR_BACKEND: chroma or numpy),
+    opening it on first use or after a generation swap.
+    """
+    global _vector_store
+    label = _sync_active_label()
+    store = _vector_store
+    if store is None:
+        with _lock:
+            if _vector_store is None:
+                _vector_store = create_backend(get_embeddings(), VECTOR_BACKEND, label)
+            store = _vector_store
+    return store
+
+
+def get_lexical_index() -> LexicalIndex:
+    """
+    Return the shared BM25 index. If no index file exists yet (store built before
+    hybrid search was added) it is backfilled once from the vector store.
+    """
+    global _lexical_index
+    label = _sync_active_label()
+    index = _lexical_index
+    if index is None:
+        with _lock:
+            if _lexical_index is None:
+                index = LexicalIndex(lexical_index_path(label))
+                if not index.exists():
+                    _backfill_lexical_index(index)
+                _lexical_index = index
+            index = _lexical_index
+    return index
+
+
+def _backfill_lexical_index(index: LexicalIndex):
+    try:
+        index.add_documents(get_vector_store().get_all())
+        print(f"Backfilled lexical index with {len(index)} chunks.")
+    except Exception as e:
+        print(f"Warning: lexical index backfill failed: {e}")
+
+
+def get_generation() -> int:
+    """Current index generation (one indexed read, so it is checked on every lookup)."""
+    return int(get_manifest().get_meta(GENERATION_KEY, "0"))
+
+
+def get_active_label() -> Optional[str]:
+    """Label of the live index generation, None for the original (pre blue/green) index."""
+    return get_manifest().get_meta(ACTIVE_INDEX_KEY)
+
+
+def _sync_active_label() -> Optional[str]:
+    """
+    Read the active generation from the manifest on every access: a rebuild in
+    another process (e.g. scripts/ingest_docs.py --force) swaps it and then drops
+    the old one, so handles opened for another label are discarded and reopened.
+    """
+    global _vector_store, _lexical_index, _active_label
+    label = get_active_label()
+    if label != _active_label:
+        with _lock:
+            if label != _active_label:
+                _vector_store = None
+                _lexical_index = None
+                _active_label = label
+                retrieval_cache.clear()
+    return label
+
+
+def new_index_label() -> str:
+    return f"{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def open_index(label: Optional[str]) -> Tuple:
+    """Open the vector store and BM25 index of a generation, e.g. a shadow being rebuilt."""
+    return (create_backend(get_embeddings(), VECTOR_BACKEND, label),
+            LexicalIndex(lexical_index_path(label)))
+
+
+def activate(label: str, documents: Optional[List[Dict]] = None) -> Optional[str]:
+    """
+    Atomically repoint readers to another index generation and return the label
+    of the one it replaced. `documents` (manifest entries of the new generation)
+    replace the manifest in the same transaction as the pointer, so the two can
+    never disagree. Queries already running finish on the old handles.
+    """
+    global _vector_store, _lexical_index, _active_label
+    with _lock:
+        previous = get_active_label()
+        if documents is None:
+            get_manifest().set_meta(ACTIVE_INDEX_KEY, label)
+        else:
+            get_manifest().replace_all(documents, meta={ACTIVE_INDEX_KEY: label})
+        get_manifest().increment_meta(GENERATION_KEY)
+        _vector_store = None
+        _lexical_index = None
+        _active_label = label
+        retrieval_cache.clear()
+    print(f"Active index is now {label} (was {previous or 'original'})")
+    return previous
+
+
+def retire(label: Optional[str]):
+    """Garbage-collect a generation that is no longer active (after a grace period)."""
+    if label == get_active_label():
+        return
+    time.sleep(RETIRE_GRACE_SECONDS)
+    try:
+        store, lexical = open_index(label)
+        store.drop()
+        lexical.drop()
+        print(f"Dropped retired index {label or 'original'}")
+    except Exception as e:
+        print(f"Warning: could not drop retired index {label}: {e}")
+
+
+def invalidate():
+    """
+    Called after the index changed: bump the index generation (in the manifest,
+    so other processes stop serving their cached results too) and drop cached
+    retrieval results. The store handle is kept: every writer must share it
+    (see create_backend); only activate() swaps it.
+    """
+    with _lock:
+        get_manifest().increment_meta(GENERATION_KEY)
+        retrieval_cache.clear()
+
+
+def embed_query(query: str) -> Tuple[List[float], bool]:
+    """
+    Embed a query through the LRU cache, skipping the model forward pass on repeats.
+    Returns (vector, cache_hit).
+    """
+    key = (EMBEDDING_SIGNATURE, normalize_query(query))
+    vector = query_embedding_cache.get(key)
+    if vector is not None:
+        return vector, True
+    vector = get_embeddings().embed_query(query)
+    query_embedding_cache.put(key, vector)
+    return vector, False
+
+
+def embed_queries(queries: List[str]) -> Tuple[List[List[float]], int]:
+    """
+    Embed several queries, running every cache miss through the model in a
+    single batched forward pass. Returns (vectors, cache_hits).
+    """
+    keys = [(EMBEDDING_SIGNATURE, normalize_query(q)) for q in queries]
+    vectors = [query_embedding_cache.get(key) for key in keys]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        # Not embed_documents: that would persist every sub-query in the chunk embedding cache
+        fresh = get_embeddings().embed_queries([queries[i] for i in missing])
+        for i, vector in zip(missing, fresh):
+            vectors[i] = vector
+            query_embedding_cache.put(keys[i], vector)
+    return vectors, len(queries) - len(missing)
+
+
+def _result_key(generation: int, query: str, k: int, filter: Optional[Dict], hybrid: bool) -> Tuple:
+    return (generation, EMBEDDING_SIGNATURE, normalize_query(query), k, json.dumps(filter, sort_keys=True), hybrid)
+
+
+def _chunk_key(doc: Document) -> str:
+    return doc.metadata.get("chunk_id") or doc.page_content
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, rrf_k: int = RRF_K) -> List[Document]:
+    """Fuse several rankings with RRF: score(d) = sum(1 / (rrf_k + rank))."""
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _chunk_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in ordered[:k]]
+
+
+def _matches_filter(doc: Document, filter: Optional[Dict]) -> bool:
+    # Only flat equality filters are supported on the lexical side
+    return not filter or all(doc.metadata.get(key) == value for key, value in filter.items())
+
+
+def _with_back_references(docs: List[Document]) -> List[Document]:
+    """
+    Duplicate chunks of other documents share one vector (see services/dedup.py);
+    list their citations under "also_cited" so answers still cite every policy.
+    Copies are returned, the store's documents are never mutated.
+    """
+    ids = [doc.metadata.get("chunk_id") for doc in docs if doc.metadata.get("chunk_id")]
+    if not ids:
+        return docs
+    copies = get_manifest().duplicates_of(ids)
+    if not copies:
+        return docs
+    results = []
+    for doc in docs:
+        own = f"{doc.metadata.get('doc_name')} (p. {doc.metadata.get('page')})"
+        cited = [f"{c['filename']} (p. {c['page']})" for c in copies.get(doc.metadata.get("chunk_id"), [])]
+        cited = [citation for citation in cited if citation != own]
+        if cited:
+            doc = Document(page_content=doc.page_content,
+                           metadata={**doc.metadata, "also_cited": list(dict.fromkeys(cited))})
+        results.append(doc)
+    return results
+
+
+def similarity_search(query: str, k: int = 4, filter: Optional[Dict] = None,
+                      hybrid: bool = True) -> Tuple[List[Document], Dict]:
+    """
+    Top-k search through the generation-tagged result cache. With hybrid=True the
+    vector ranking is fused with the BM25 ranking, so exact terms like
+    "gift cards" or "30 days" are found without raising k.
+    Returns (documents, info) where info says which caches were hit.
+    """
+    # Capture the generation before searching so a result computed while the
+    # index changes is stored under the old generation and never served
+    generation = get_generation()
+    key = _result_key(generation, query, k, filter, hybrid)
+    results = retrieval_cache.get(key)
+    if results is not None:
+        return results, {"result_cache": "hit", "embedding_cache": "skipped", "index_generation": generation}
+
+    query_vector, embedding_hit = embed_query(query)
+    info = {
+        "result_cache": "miss",
+        "embedding_cache": "hit" if embedding_hit else "miss",
+        "index_generation": generation
+    }
+    if not hybrid:
+        results = get_vector_store().search_by_vector(query_vector, k=k, filter=filter)
+    else:
+        n_candidates = max(k, HYBRID_CANDIDATES)
+        vector_hits = get_vector_store().search_by_vector(query_vector, k=n_candidates, filter=filter)
+        lexical_hits = [
+            doc for doc, _ in get_lexical_index().search(query, k=n_candidates)
+            if _matches_filter(doc, filter)
+        ]
+        results = reciprocal_rank_fusion([vector_hits, lexical_hits], k=k)
+        info["lexical_hits"] = len(lexical_hits)
+
+    results = _with_back_references(results)
+    retrieval_cache.put(key, results)
+    return results, info
+
+
+def batch_similarity_search(queries: List[str], k: int = 4,
+                            hybrid: bool = True) -> Tuple[List[List[Document]], Dict]:
+    """
+    Top-k search for several sub-queries at once: one embedding pass for all
+    uncached queries and one Chroma call for all vector searches.
+    Returns (per-query document lists, info).
+    """
+    generation = get_generation()
+    keys = [_result_key(generation, q, k, None, hybrid) for q in queries]
+    results: List[Optional[List[Document]]] = [retrieval_cache.get(key) for key in keys]
+    pending = [i for i, docs in enumerate(results) if docs is None]
+
+    vectors, embedding_hits = embed_queries([queries[i] for i in pending])
+    n_candidates = max(k, HYBRID_CANDIDATES) if hybrid else k
+    # All vector searches in one backend call (one Chroma query / one matrix product)
+    vector_hits = get_vector_store().search_many(vectors, n_candidates)
+    for i, hits in zip(pending, vector_hits):
+        if hybrid:
+            lexical_hits = [doc for doc, _ in get_lexical_index().search(queries[i], k=n_candidates)]
+            hits = reciprocal_rank_fusion([hits, lexical_hits], k=k)
+        hits = _with_back_references(hits)
+        results[i] = hits
+        retrieval_cache.put(keys[i], hits)
+
+    return results, {
+        "result_cache_hits": len(queries) - len(pending),
+        "embedding_cache_hits": embedding_hits,
+        "embedded": len(pending) - embedding_hits,
+        "index_generation": generation
+    }
+
+
+def get_cache_stats() -> Dict[str, Dict]:
+    """Cache counters for the debug panel."""
+    return {
+        "query_embeddings": query_embedding_cache.stats(),
+        "retrieval_results": {**retrieval_cache.stats(), "index_generation": get_generation()},
+        "chunk_embeddings": get_embeddings().cache.stats()
+    }
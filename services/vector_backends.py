@@ -0,0 +1,381 @@
+import os
+import json
+import time
+import uuid
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Constants
+CHROMA_PATH = "data/chroma_db"
+NUMPY_INDEX_PATH = "data/numpy_index"
+# Which store PolicyEngine and query_policies use: "chroma" or "numpy"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+# Storage precision of the numpy matrix: "float16" or "int8"
+NUMPY_INDEX_DTYPE = os.getenv("NUMPY_INDEX_DTYPE", "float16").lower()
+# Rows scored per block, bounds the float32 upcast during search
+SEARCH_BLOCK_ROWS = 65536
+# Collection langchain_chroma uses when none is given (indexes built before blue/green rebuilds)
+DEFAULT_COLLECTION = "langchain"
+
+# One backend instance per (backend, index location), see create_backend()
+_shared_lock = threading.Lock()
+_shared: Dict[Tuple[str, str], object] = {}
+
+
+def index_location(backend: str, label: Optional[str] = None) -> str:
+    """Chroma collection name or NumPy directory of an index generation; None is the original index."""
+    if backend == "numpy":
+        return os.path.join(NUMPY_INDEX_PATH, label) if label else NUMPY_INDEX_PATH
+    return f"policies_{label}" if label else DEFAULT_COLLECTION
+
+
+def _matches(metadata: Dict, filter: Optional[Dict]) -> bool:
+    return not filter or all(metadata.get(key) == value for key, value in filter.items())
+
+
+class ChromaBackend:
+    """Thin adapter so PolicyEngine and the retriever don't touch Chroma internals directly."""
+
+    name = "chroma"
+
+    def __init__(self, embeddings, persist_directory: str = CHROMA_PATH, collection_name: str = DEFAULT_COLLECTION):
+        self.embeddings = embeddings
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        self._open()
+
+    def _open(self):
+        from langchain_chroma import Chroma
+        self.store = Chroma(
+            persist_directory=self.persist_directory,
+            collection_name=self.collection_name,
+            embedding_function=self.embeddings
+        )
+
+    def add_documents(self, docs: List[Document], ids: Optional[List[str]] = None):
+        if docs:
+            self.store.add_documents(docs, ids=ids)
+
+    def delete_document(self, doc_id: str):
+        self.store._collection.delete(where={"doc_id": doc_id})
+
+    def delete_ids(self, ids: List[str]):
+        if ids:
+            self.store._collection.delete(ids=ids)
+
+    def clear(self):
+        # Dropping the collection is O(1) in memory, unlike fetching every id to delete it
+        self.store.delete_collection()
+        self._open()
+
+    def drop(self):
+        """Delete the collection for good (retired index generation)."""
+        self.store.delete_collection()
+        _release(self.name, self.collection_name)
+
+    def count(self) -> int:
+        return self.store._collection.count()
+
+    def get_all(self) -> List[Document]:
+        data = self.store.get(include=["documents", "metadatas"])
+        return [Document(page_content=text, metadata=meta or {}) for text, meta in zip(data["documents"], data["metadatas"])]
+
+    def get_by_ids(self, ids: List[str]) -> List[Document]:
+        if not ids:
+            return []
+        data = self.store.get(ids=ids, include=["documents", "metadatas"])
+        return [Document(page_content=text, metadata=meta or {}) for text, meta in zip(data["documents"], data["metadatas"])]
+
+    def search_by_vector(self, vector: List[float], k: int, filter: Optional[Dict] = None) -> List[Document]:
+        return self.store.similarity_search_by_vector(vector, k=k, filter=filter)
+
+    def search_many(self, vectors: List[List[float]], k: int) -> List[List[Document]]:
+        """Several top-k searches in one collection.query call."""
+        if not vectors:
+            return []
+        data = self.store._collection.query(
+            query_embeddings=vectors,
+            n_results=k,
+            include=["documents", "metadatas"]
+        )
+        return [
+            [Document(page_content=text, metadata=meta or {}) for text, meta in zip(texts, metas)]
+            for texts, metas in zip(data["documents"], data["metadatas"])
+        ]
+
+
+class NumpyBackend:
+    """
+    Compact exact-search store for small corpora (a few thousand chunks).
+
+    Files under `path`:
+        vectors-<version>.npy  L2-normalised embeddings as float16, or int8 with per-row scales
+        scales-<version>.npy   float32 per-row dequantisation scales (int8 only)
+        meta.json              version, ids, texts and metadata, row-aligned with the vectors
+
+    The matrix is memory-mapped read-only, so opening is near-instant and pages
+    are shared with the OS cache. A write saves the matrix under a new version
+    and then atomically replaces meta.json, which names that version. meta.json
+    is the only file ever replaced, so a reader always pairs rows with the
+    metadata written alongside them. Every writer in the process must go through
+    the same instance (and its lock); use create_backend(). Files swapped in by
+    another process are picked up before the next read or write.
+    """
+
+    name = "numpy"
+
+    def __init__(self, embeddings, path: str = NUMPY_INDEX_PATH, dtype: str = NUMPY_INDEX_DTYPE):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported NUMPY_INDEX_DTYPE '{dtype}' (use float16 or int8)")
+        self.embeddings = embeddings
+        self.path = path
+        self.dtype = dtype
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._open()
+
+    # --- persistence ---
+    def _vectors_file(self, version: Optional[str]) -> str:
+        # Indexes written before versioning have a single unversioned matrix
+        return os.path.join(self.path, f"vectors-{version}.npy" if version else "vectors.npy")
+
+    def _scales_file(self, version: Optional[str]) -> str:
+        return os.path.join(self.path, f"scales-{version}.npy" if version else "scales.npy")
+
+    @property
+    def _meta_file(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def _file_id(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self._meta_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _refresh(self):
+        """Re-open if another process swapped in new files since we last loaded them."""
+        with self._lock:
+            if self._file_id() != self._loaded_id:
+                self._open()
+
+    def _open(self):
+        for attempt in range(3):
+            self._loaded_id = self._file_id()
+            try:
+                with open(self._meta_file, 'r') as f:
+                    meta = json.load(f)
+            except FileNotFoundError:
+                break
+            if meta.get("dtype") != self.dtype:
+                raise ValueError(
+                    f"Index at {self.path} is {meta.get('dtype')} but NUMPY_INDEX_DTYPE={self.dtype}; re-index to convert."
+                )
+            version = meta.get("version")
+            try:
+                vectors = np.load(self._vectors_file(version), mmap_mode="r")
+                scales = np.load(self._scales_file(version), mmap_mode="r") if self.dtype == "int8" else None
+            except FileNotFoundError:
+                # Superseded and cleaned up by writers in between: read the new meta.json
+                continue
+            self._version: Optional[str] = version
+            self.ids: List[str] = meta["ids"]
+            self.texts: List[str] = meta["texts"]
+            self.metadatas: List[Dict] = meta["metadatas"]
+            self.vectors, self.scales = vectors, scales
+            self._row_of = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+            return
+        else:
+            # Kept losing the race with writers: look again on the next access
+            self._loaded_id = None
+        self._version = None
+        self.ids, self.texts, self.metadatas = [], [], []
+        self.vectors, self.scales = None, None
+        self._row_of = {}
+
+    def _write(self, ids: List[str], texts: List[str], metadatas: List[Dict], vectors: np.ndarray, scales: Optional[np.ndarray]):
+        # New version files first, then swap meta.json to point at them; readers holding the old mmap keep working
+        previous = self._version
+        version = f"{time.time_ns():x}{uuid.uuid4().hex[:6]}"
+        np.save(self._vectors_file(version), vectors)
+        if scales is not None:
+            np.save(self._scales_file(version), scales)
+        with open(self._meta_file + ".tmp", 'w') as f:
+            json.dump({"dtype": self.dtype, "dim": int(vectors.shape[1]) if vectors.size else 0, "version": version,
+                       "ids": ids, "texts": texts, "metadatas": metadatas}, f)
+        os.replace(self._meta_file + ".tmp", self._meta_file)
+        # The version just replaced stays for readers that loaded meta.json a moment ago
+        self._remove_versions(keep={version, previous})
+        self._open()
+
+    def _remove_versions(self, keep: set):
+        for name in os.listdir(self.path):
+            if not (name.startswith(("vectors", "scales")) and name.endswith(".npy")):
+                continue
+            version = name[:-len(".npy")].partition("-")[2] or None
+            if version not in keep:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+
+    def _quantize(self, matrix: np.ndarray):
+        matrix = matrix.astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        if self.dtype == "float16":
+            return matrix.astype(np.float16), None
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _rewrite_without(self, drop_rows: set):
+        keep = [row for row in range(len(self.ids)) if row not in drop_rows]
+        if self.vectors is None or not drop_rows:
+            return
+        vectors = np.asarray(self.vectors)[keep]
+        scales = np.asarray(self.scales)[keep] if self.scales is not None else None
+        self._write([self.ids[r] for r in keep], [self.texts[r] for r in keep],
+                    [self.metadatas[r] for r in keep], vectors, scales)
+
+    # --- write API ---
+    def add_embeddings(self, ids: List[str], vectors: List[List[float]], texts: List[str], metadatas: List[Dict]):
+        """Upsert pre-computed embeddings (existing ids are replaced)."""
+        if not ids:
+            return
+        with self._lock:
+            self._refresh()
+            replaced = {self._row_of[i] for i in ids if i in self._row_of}
+            keep = [row for row in range(len(self.ids)) if row not in replaced]
+            new_vectors, new_scales = self._quantize(np.asarray(vectors))
+            if self.vectors is not None and keep:
+                all_vectors = np.concatenate([np.asarray(self.vectors)[keep], new_vectors])
+                all_scales = np.concatenate([np.asarray(self.scales)[keep], new_scales]) if new_scales is not None else None
+            else:
+                all_vectors, all_scales = new_vectors, new_scales
+            self._write(
+                [self.ids[r] for r in keep] + list(ids),
+                [self.texts[r] for r in keep] + list(texts),
+                [self.metadatas[r] for r in keep] + [dict(m) for m in metadatas],
+                all_vectors, all_scales
+            )
+
+    def add_documents(self, docs: List[Document], ids: Optional[List[str]] = None):
+        if not docs:
+            return
+        ids = ids or [d.metadata.get("chunk_id") or f"row_{len(self.ids) + i}" for i, d in enumerate(docs)]
+        vectors = self.embeddings.embed_documents([d.page_content for d in docs])
+        self.add_embeddings(ids, vectors, [d.page_content for d in docs], [d.metadata for d in docs])
+
+    def delete_document(self, doc_id: str):
+        with self._lock:
+            self._refresh()
+            self._rewrite_without({row for row, meta in enumerate(self.metadatas) if meta.get("doc_id") == doc_id})
+
+    def delete_ids(self, ids: List[str]):
+        with self._lock:
+            self._refresh()
+            self._rewrite_without({self._row_of[i] for i in ids if i in self._row_of})
+
+    def clear(self):
+        with self._lock:
+            if os.path.exists(self._meta_file):
+                os.remove(self._meta_file)
+            self._remove_versions(keep=set())
+            self._open()
+
+    def drop(self):
+        """Delete the index files (retired index generation)."""
+        self.clear()
+        try:
+            os.rmdir(self.path)
+        except OSError:
+            pass  # still holds other generations
+        _release(self.name, self.path)
+
+    # --- read API ---
+    def count(self) -> int:
+        self._refresh()
+        return len(self.ids)
+
+    def get_all(self) -> List[Document]:
+        with self._lock:
+            self._refresh()
+            return [Document(page_content=t, metadata=dict(m)) for t, m in zip(self.texts, self.metadatas)]
+
+    def get_by_ids(self, ids: List[str]) -> List[Document]:
+        with self._lock:
+            self._refresh()
+            rows = [self._row_of[i] for i in ids if i in self._row_of]
+            return [Document(page_content=self.texts[r], metadata=dict(self.metadatas[r])) for r in rows]
+
+    def _top_k(self, queries: np.ndarray, k: int, filter: Optional[Dict] = None) -> List[List[Document]]:
+        # Snapshot the current arrays so a concurrent rewrite can't shift rows under us
+        with self._lock:
+            self._refresh()
+            vectors, scales, texts, metadatas = self.vectors, self.scales, self.texts, self.metadatas
+        if vectors is None or not len(texts):
+            return [[] for _ in range(len(queries))]
+        queries = queries.astype(np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        # Exact cosine: rows are pre-normalised, so a block-wise dot product is enough
+        scores = np.empty((len(queries), len(texts)), dtype=np.float32)
+        for start in range(0, len(texts), SEARCH_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            if scales is not None:
+                block *= np.asarray(scales[start:start + SEARCH_BLOCK_ROWS])[:, None]
+            scores[:, start:start + len(block)] = queries @ block.T
+
+        if filter:
+            mask = np.array([_matches(meta, filter) for meta in metadatas])
+            scores[:, ~mask] = -np.inf
+
+        k = min(k, len(texts))
+        results = []
+        for row_scores in scores:
+            top = np.argpartition(-row_scores, k - 1)[:k]
+            top = top[np.argsort(-row_scores[top])]
+            results.append([
+                Document(page_content=texts[i], metadata=dict(metadatas[i]))
+                for i in top if np.isfinite(row_scores[i])
+            ])
+        return results
+
+    def search_by_vector(self, vector: List[float], k: int, filter: Optional[Dict] = None) -> List[Document]:
+        return self._top_k(np.asarray([vector]), k, filter)[0]
+
+    def search_many(self, vectors: List[List[float]], k: int) -> List[List[Document]]:
+        if not vectors:
+            return []
+        return self._top_k(np.asarray(vectors), k)
+
+
+def create_backend(embeddings, backend: str = VECTOR_BACKEND, label: Optional[str] = None):
+    """
+    The configured vector store backend for an index generation (None = original index).
+    Instances are shared per index location, so concurrent writers (job queue
+    workers, the watcher, a rebuild) serialise on one lock and one view of the
+    files instead of each rewriting the index from its own stale copy.
+    """
+    if backend not in ("chroma", "numpy"):
+        raise ValueError(f"Unknown VECTOR_BACKEND '{backend}' (use chroma or numpy)")
+    location = index_location(backend, label)
+    with _shared_lock:
+        instance = _shared.get((backend, location))
+        if instance is None:
+            if backend == "chroma":
+                instance = ChromaBackend(embeddings, collection_name=location)
+            else:
+                instance = NumpyBackend(embeddings, path=location)
+            _shared[(backend, location)] = instance
+    return instance
+
+
+def _release(backend: str, location: str):
+    """Forget the shared instance of a dropped index, so reopening it starts fresh."""
+    with _shared_lock:
+        _shared.pop((backend, location), None)
@@ -1,12 +1,12 @@
 import streamlit as st
-import sqlite3
 import os
 import shutil
 import streamlit_shadcn_ui as ui
 import pandas as pd
 import json
 
-DB_PATH = "data/database.sqlite"
+from services.db_pool import read_pool
+
 POLICIES_DIR = "data/policies"
 
 def get_lucide_script():
@@ -64,25 +64,22 @@ def lucide_icon(name, size=None, additional_classes=""):
 def get_db_status():
     """
     Returns counts of customers and tickets from the database.
-    Using sqlite3 directly for speed and reliability.
+    Runs on every rerun, so it uses the pooled read-only connection.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Count Customers
-        cursor.execute("SELECT COUNT(*) FROM customers")
-        customer_count = cursor.fetchone()[0]
-        
-        # Count Tickets
-        # Assuming there is a tickets table, if not catch error
-        try:
-            cursor.execute("SELECT COUNT(*) FROM tickets")
-            ticket_count = cursor.fetchone()[0]
-        except:
-            ticket_count = 0
+        with read_pool.cursor() as cursor:
+            # Count Customers
+            cursor.execute("SELECT COUNT(*) FROM customers")
+            customer_count = cursor.fetchone()[0]
+            
+            # Count Tickets
+            # Assuming there is a tickets table, if not catch error
+            try:
+                cursor.execute("SELECT COUNT(*) FROM tickets")
+                ticket_count = cursor.fetchone()[0]
+            except:
+                ticket_count = 0
             
-        conn.close()
         return {"connected": True, "customers": customer_count, "tickets": ticket_count}
     except Exception as e:
         return {"connected": False, "error": str(e)}
@@ -109,12 +106,21 @@ def list_indexed_files():
 
 def render_customer_card(data_str):
     """
-    Parses a string representation of a list of dicts (from SQL tool)
-    and renders a nice Grid layout card.
+    Parses the SQL tool output (columnar JSON: columns + rows, or a legacy
+    list of dicts) and renders a nice Grid layout card.
     """
     try:
         from ast import literal_eval
-        data = literal_eval(data_str)
+        total = None
+        try:
+            result = json.loads(data_str)
+        except ValueError:
+            result = literal_eval(data_str)
+        if isinstance(result, dict) and "columns" in result:
+            data = [dict(zip(result["columns"], row)) for row in result["rows"]]
+            total = result.get("total")
+        else:
+            data = result
         
         if not isinstance(data, list) or not data:
             st.warning("No data to display.")
@@ -125,7 +131,7 @@ def render_customer_card(data_str):
             return
 
         # Use efficient grid layout
-        st.caption(f"Found {len(data)} customers")
+        st.caption(f"Found {total if total is not None else len(data)} customers")
         
         cols = st.columns(3)
         for i, item in enumerate(data[:6]): # Limit to 6
@@ -153,7 +159,7 @@ def render_customer_card(data_str):
                     st.caption(f"ID: {item.get('id')}")
                     
         if len(data) > 6:
-            st.caption(f"...and {len(data)-6} more.")
+            st.caption(f"...and {(total or len(data)) - 6} more.")
             with st.expander("View Raw Data"):
                 st.dataframe(pd.DataFrame(data))
 